@@ -1,9 +1,10 @@
 """ This file provides a bare-bone Tetris game controller """
 
 # Imports
-import random
 import TetrisUtils as TUtils
 from TetrisSettings import *
+from TetrisBitboard import BitBoard
+from TetrisStream import TileStream
 
 
 # This is the bare bones of the tetris game
@@ -14,15 +15,24 @@ class Tetris:
     # - the game
     # - score
     # - fitness
-    def __init__(self):
+    def __init__(self, bitboard: bool = USE_BITBOARD, seed=None, record: bool = False):
         ##################
         # Game logistics #
         ##################
         # Game over indicator
         self.game_over = True
-        # Game board: 2D array of integers representing pieces
+        # Game board: 2D array of integers representing pieces (or a BitBoard if <BITBOARD>)
+        self.bitboard = bitboard
         self.board = []
-        self.tile_pool = []
+        # Height of each column, kept up to date on tile lock and line clear
+        self.col_heights = []
+        # Zobrist hash of the board, kept up to date on tile lock and line clear
+        self.board_hash = 0
+        # Upcoming tiles, seeded with <SEED> (None to use the global random state)
+        self.tile_stream = TileStream(seed)
+        # Placements played with play_placement(), packed 1 byte each (None if not recording)
+        self.record = record
+        self.placements = None
         # Tiles are represented as strings in:
         # ["LINE", "L", "L_REVERSED", "S", "S_REVERSED", "T", "CUBE"]
         self.current_tile = ""
@@ -33,6 +43,12 @@ class Tetris:
         # Current tile shape
         # Save this in order to save tile rotations
         self.tile_shape = []
+        # Index of the current tile shape in TUtils.TILE_ORIENTATIONS
+        self.tile_rotation = 0
+        # Bumped whenever the board or the current tile may have changed, so displays can skip unchanged games
+        self.version = 0
+        # Last snapshot taken with get_snapshot(), reused until the version changes
+        self.snapshot = None
 
         ##############
         # Statistics #
@@ -42,12 +58,25 @@ class Tetris:
         # Make the board playable
         self.reset_game()
 
-    def reset_game(self):
-        """ Resets the entire game including statistics """
+    def reset_game(self, seed=None):
+        """
+        Resets the entire game including statistics
+
+        :param seed: restart the tile stream from this seed, None to keep the current stream going
+        """
         self.game_over = False
-        self.board = [[0] * GRID_COL_COUNT for _ in range(GRID_ROW_COUNT)]
+        if seed is not None:
+            self.tile_stream.reset(seed)
+        self.placements = bytearray() if self.record else None
+        if self.bitboard:
+            self.board = BitBoard()
+        else:
+            self.board = [[0] * GRID_COL_COUNT for _ in range(GRID_ROW_COUNT)]
+        self.col_heights = [0] * GRID_COL_COUNT
+        self.board_hash = TUtils.get_board_hash(self.board)
         self.spawn_tile()
         self.score = 0.0
+        self.version += 1
 
     def step(self, action: int):
         """
@@ -59,6 +88,7 @@ class Tetris:
         # If game over, ignore step request until reset() is called
         if self.game_over:
             return
+        self.version += 1
         # Move tile
         if action in [1, 2, 3, 4]:
             self.move_tile((-1 if action in [1, 3] else 1) * (1 if action in [1, 2] else 2))
@@ -81,41 +111,30 @@ class Tetris:
         :return: whether the game is over
         """
         self.current_tile = self.get_next_tile(pop=True)
-        self.tile_shape = TILE_SHAPES[self.current_tile][:]
+        self.tile_shape = TUtils.TILE_ORIENTATIONS[self.current_tile][0].shape
+        self.tile_rotation = 0
         self.tile_x = int(GRID_COL_COUNT / 2 - len(self.tile_shape[0]) / 2)
         self.tile_y = 0
 
         # Game over check: game over if new tile collides with existing blocks
         return TUtils.check_collision(self.board, self.tile_shape, (self.tile_x, self.tile_y))
 
-    def generate_tile_pool(self):
-        """ Resets the tile pool """
-        self.tile_pool = list(TILE_SHAPES.keys())
-        random.shuffle(self.tile_pool)
-
     def on_tile_collision(self):
         # Add current tile to board
+        self.board_hash = TUtils.add_tile_with_hash(self.board, self.tile_shape, (self.tile_x, self.tile_y - 1), self.board_hash)
+
+        # Raise column heights to the top of the locked tile
         for cy, row in enumerate(self.tile_shape):
+            height = GRID_ROW_COUNT - (cy + self.tile_y - 1)
             for cx, val in enumerate(row):
-                if val == 0:
-                    continue
-                self.board[cy + self.tile_y - 1][min(cx + self.tile_x, 9)] = val
+                if val != 0 and self.col_heights[cx + self.tile_x] < height:
+                    self.col_heights[cx + self.tile_x] = height
 
         # Check completed rows
-        row_completed = 0
-        row_index = 0
-        while True:
-            if row_index >= len(self.board):
-                break
-            # If there's any unfilled space
-            if 0 in self.board[row_index]:
-                row_index += 1
-                continue
-            # Delete the completed row
-            del self.board[row_index]
-            # Insert empty row on top
-            self.board.insert(0, [0] * GRID_COL_COUNT)
-            row_completed += 1
+        self.board, row_completed, self.board_hash = TUtils.clear_lines_with_hash(self.board, self.board_hash)
+        # Completed rows can uncover holes, so heights are recalculated
+        if row_completed:
+            self.col_heights = TUtils.get_col_heights(self.board)
 
         # Calculate total score
         self.score += MULTI_SCORE_ALGORITHM(row_completed)
@@ -134,7 +153,7 @@ class Tetris:
         """
         if instant:
             # Drop the tile until it collides with existing block(s)
-            new_y = TUtils.get_effective_height(self.board, self.tile_shape, (self.tile_x, self.tile_y))
+            new_y = TUtils.get_effective_height(self.board, self.tile_shape, (self.tile_x, self.tile_y), self.col_heights)
             self.tile_y = new_y + 1
             self.score += PER_STEP_SCORE_GAIN * (new_y - self.tile_y)
         else:
@@ -166,7 +185,9 @@ class Tetris:
 
     def rotate_tile(self):
         """ Rotate current tile by 90 degrees """
-        new_tile_shape = TUtils.get_rotated_tile(self.tile_shape)
+        orientations = TUtils.TILE_ORIENTATIONS[self.current_tile]
+        new_rotation = (self.tile_rotation + 1) % len(orientations)
+        new_tile_shape = orientations[new_rotation].shape
         new_x = self.tile_x
         # Out of range detection
         if self.tile_x + len(new_tile_shape[0]) > GRID_COL_COUNT:
@@ -178,12 +199,13 @@ class Tetris:
         # Apply tile properties
         self.tile_x = new_x
         self.tile_shape = new_tile_shape
+        self.tile_rotation = new_rotation
 
     def swap_tile(self):
         """ Swaps current tile with the future one """
         # Get next tile without popping (swapping could fail)
         new_tile = self.get_next_tile(pop=False)
-        new_tile_shape = TILE_SHAPES[new_tile][:]  # clone tile shape
+        new_tile_shape = TUtils.TILE_ORIENTATIONS[new_tile][0].shape
         temp_x, temp_y = self.tile_x, self.tile_y
 
         # Out of range detection
@@ -196,20 +218,117 @@ class Tetris:
         if TUtils.check_collision(self.board, new_tile_shape, (temp_x, temp_y)):
             return
         # Put current tile as the next tile
-        self.tile_pool[0] = self.current_tile
+        self.tile_stream.replace(self.current_tile)
         # Apply tile properties
         self.current_tile = new_tile
         self.tile_shape = new_tile_shape
+        self.tile_rotation = 0
         self.tile_x, self.tile_y = temp_x, temp_y
 
+    ##########################
+    # Placement-level Action #
+    ##########################
+    def place(self, tile_choice: int, rotation: int, x: int) -> bool:
+        """
+        Place a tile in one call: swap, rotate, move and instantly drop it, then spawn the next tile
+
+        The tile follows the same path as the frame-by-frame actions (TUtils.get_action_sequence) including the 1 grid
+        drop after each action, so the resulting board and score are the same as stepping through those actions.
+
+        :param tile_choice: 0 = current tile, 1 = next tile (swap first)
+        :param rotation: number of rotations from the tile's spawn orientation
+        :param x: target x offset
+        :return: whether the placement is reachable; if not, the game is left unchanged
+        """
+        if self.game_over:
+            return False
+        swap = tile_choice != 0
+        tile = self.get_next_tile(pop=False) if swap else self.current_tile
+        orientations = TUtils.TILE_ORIENTATIONS[tile]
+        rotation %= len(orientations)
+        start_rotation = 0 if swap else self.tile_rotation
+        if not 0 <= x <= GRID_COL_COUNT - orientations[rotation].width:
+            return False
+        actions = TUtils.get_action_sequence(swap, (rotation - start_rotation) % len(orientations), self.tile_x, x)
+
+        # Validate the path without changing the game
+        tile_shape, tile_x, tile_y = self.tile_shape, self.tile_x, self.tile_y
+        tile_rotation = self.tile_rotation
+        for action in actions[:-1]:
+            if action == ACTIONS.index("SWAP"):
+                # Out of range detection (uses the current tile's size, same as swap_tile)
+                tile_x = min(tile_x, GRID_COL_COUNT - len(tile_shape[0]))
+                tile_y = min(tile_y, GRID_ROW_COUNT - len(tile_shape))
+                tile_shape, tile_rotation = orientations[0].shape, 0
+            elif action == ACTIONS.index("ROTATE"):
+                tile_rotation = (tile_rotation + 1) % len(orientations)
+                tile_shape = orientations[tile_rotation].shape
+                tile_x = min(tile_x, GRID_COL_COUNT - len(tile_shape[0]))
+            else:
+                tile_x += (-1 if action in [1, 3] else 1) * (1 if action in [1, 2] else 2)
+            # The action would be refused
+            if TUtils.check_collision(self.board, tile_shape, (tile_x, tile_y)):
+                return False
+            # Drop tile by 1 grid; the tile would lock before reaching its target
+            tile_y += 1
+            if TUtils.check_collision(self.board, tile_shape, (tile_x, tile_y)):
+                return False
+
+        # Apply the placement
+        self.version += 1
+        if swap:
+            self.tile_stream.replace(self.current_tile)
+            self.current_tile = tile
+        self.tile_shape, self.tile_rotation, self.tile_x, self.tile_y = tile_shape, tile_rotation, tile_x, tile_y
+        # Added one step at a time so the score matches the frame-by-frame path exactly
+        for _ in range(len(actions) - 1):
+            self.score += PER_STEP_SCORE_GAIN
+        self.drop_tile(instant=True)
+        # Drop the next tile by 1 grid, same as the end of step()
+        self.drop_tile()
+        return True
+
+    def play_placement(self, tile_choice: int, rotation: int, x: int):
+        """
+        Place a tile with place(), or step through its actions if it can't be placed in one call
+
+        The placement is recorded if recording, so the game can be re-simulated with get_replay(). An invalid placement
+        (agents return (-1, -1, -1) when they find none) instantly drops the current tile where it is.
+
+        :param tile_choice: 0 = current tile, 1 = next tile (swap first)
+        :param rotation: number of rotations (see place())
+        :param x: target x offset
+        """
+        if self.game_over:
+            return
+        if self.placements is not None:
+            self.placements.append(TUtils.pack_placement(tile_choice, rotation, x))
+        if not TUtils.is_valid_placement(tile_choice, rotation, x):
+            self.step(ACTIONS.index("INSTA_FALL"))
+            return
+        if self.place(tile_choice, rotation, x):
+            return
+        for action in TUtils.get_action_sequence(tile_choice != 0, rotation, self.tile_x, x):
+            self.step(action)
+
+    def get_replay(self) -> TUtils.GameReplay:
+        """ Replay of the game so far, only complete if the game is seeded and played with play_placement() """
+        assert self.placements is not None, "Not recording, create the game with record=True"
+        return TUtils.GameReplay(self.tile_stream.seed, bytes(self.placements), self.score, self.board_hash)
+
     #####################
     # Utility Functions #
     #####################
+    def get_snapshot(self) -> TUtils.GameSnapshot:
+        """ Immutable copy of the board, current tile and score, for displays running on another thread """
+        if self.snapshot is None or self.snapshot.version != self.version:
+            self.snapshot = TUtils.GameSnapshot(tuple(map(tuple, self.board)), tuple(map(tuple, self.tile_shape)),
+                                                self.tile_x, self.tile_y, self.game_over, self.score, self.version)
+        return self.snapshot
+
     def get_next_tile(self, pop=False):
-        """ Obtains the next tile from the tile pool """
-        if not self.tile_pool:
-            self.generate_tile_pool()
-        return self.tile_pool[0] if not pop else self.tile_pool.pop(0)
+        """ Obtains the next tile from the tile stream """
+        return self.tile_stream.pop() if pop else self.tile_stream.peek()
 
 
 # Test game board using step action
@@ -1,10 +1,11 @@
 # Imports
+import time
 import random
 from typing import *
 from Tetris import Tetris
 import TetrisUtils as TUtils
+import TetrisBatch as TBatch
 from TetrisSettings import *
-from TetrisParallel import MUTATION_RATE
 
 
 class BaseAgent:
@@ -15,10 +16,28 @@ class BaseAgent:
 
     def get_action(self, tetris: Tetris) -> int:
         if len(self.action_queue) == 0:
-            self.action_queue = self.calculate_actions(tetris.board, tetris.tile_shape, TILE_SHAPES[tetris.get_next_tile()], (tetris.tile_x, tetris.tile_y))
+            self.action_queue = self.calculate_actions(tetris.board, tetris.tile_shape, TILE_SHAPES[tetris.get_next_tile()], (tetris.tile_x, tetris.tile_y), tetris.board_hash)
         return self.action_queue.pop(0)
 
-    def calculate_actions(self, board, current_tile, next_tile, offsets) -> List[int]:
+    def get_placement(self, tetris: Tetris) -> Tuple[int, int, int]:
+        """ Get the best placement for Tetris.place(), as (tile choice, rotation, x) """
+        return self.calculate_placement(tetris.board, tetris.tile_shape, TILE_SHAPES[tetris.get_next_tile()], (tetris.tile_x, tetris.tile_y), tetris.board_hash)
+
+    def calculate_placement(self, board, current_tile, next_tile, offsets, board_hash=None) -> Tuple[int, int, int]:
+        """
+        Get the best placement from the current board and tile situation
+
+        :param board: Tetris board matrix (2D list)
+        :param current_tile: current tile shape (2D list)
+        :param next_tile: next tile shape (2D list)
+        :param offsets: x, y offsets of the current tile (int, int)
+        :param board_hash: Zobrist hash of the board (optional, used for caching)
+        :return: (tile choice, rotation, x); tile choice is 0 for the current tile and 1 for the next tile
+        """
+        # Overridden by sub-classes
+        return 0, 0, offsets[0]
+
+    def calculate_actions(self, board, current_tile, next_tile, offsets, board_hash=None) -> List[int]:
         """
         Get best actions from the current board and tile situation
 
@@ -26,6 +45,7 @@ class BaseAgent:
         :param current_tile: current tile shape (2D list)
         :param next_tile: next tile shape (2D list)
         :param offsets: x, y offsets of the current tile (int, int)
+        :param board_hash: Zobrist hash of the board (optional, used for caching)
         :return: list of actions to take, actions will be executed in order
         """
         # Overridden by sub-classes
@@ -35,13 +55,16 @@ class BaseAgent:
 class RandomAgent(BaseAgent):
     """ Agent that randomly picks actions """
 
-    def calculate_actions(self, board, current_tile, next_tile, offsets):
+    def calculate_actions(self, board, current_tile, next_tile, offsets, board_hash=None):
         return [random.randint(0, 8) for _ in range(10)]
 
 
 class GeneticAgent(BaseAgent):
     """ Agent that uses genetics to predict the best action """
 
+    # Shared TetrisCache.FeatureCache of placement features, None to disable caching
+    feature_cache = None
+
     def __init__(self):
         super().__init__()
         # TODO: Initialize weights randomly
@@ -68,11 +91,25 @@ class GeneticAgent(BaseAgent):
         # Return the final score
         return score
 
-    def cross_over(self, agent):
+    def evaluate_placement(self, board, tile, offsets, heights=None, board_hash=None):
+        """
+        Fitness score of dropping a tile onto the board
+
+        :param board: the current Tetris board
+        :param tile: the tile shape to drop
+        :param offsets: x, y offsets of the tile before dropping
+        :param heights: column heights of the board (optional)
+        :param board_hash: Zobrist hash of the board (optional, used for caching)
+        :return: fitness score of the resulting board
+        """
+        return self.get_fitness(TUtils.get_future_board_with_tile(board, tile, offsets, True, heights))
+
+    def cross_over(self, agent, mutation_rate=MUTATION_RATE):
         """
         "Breed" with another agent to produce a "child"
 
         :param agent: the other parent agent
+        :param mutation_rate: chance of each weight being mutated
         :return: "child" agent
         """
         # Create a new agent (the child agent)
@@ -88,7 +125,7 @@ class GeneticAgent(BaseAgent):
         return child
 
     # Overrides parent's "abstract" method
-    def calculate_actions(self, board, current_tile, next_tile, offsets) -> List[int]:
+    def calculate_actions(self, board, current_tile, next_tile, offsets, board_hash=None) -> List[int]:
         """
         Calculate action sequence based on the agent's prediction
 
@@ -96,47 +133,51 @@ class GeneticAgent(BaseAgent):
         :param current_tile: the current Tetris tile
         :param next_tile: the next Tetris tile (swappable)
         :param offsets: the current Tetris tile's coordinates
+        :param board_hash: Zobrist hash of the board (optional, calculated if caching)
         :return: list of actions (integers) that should be executed in order
         """
+        best_tile_index, best_rotation, best_x = self.calculate_placement(board, current_tile, next_tile, offsets,
+                                                                          board_hash)
+        # Convert the best placement into sequences of actions
+        return TUtils.get_action_sequence(best_tile_index != 0, best_rotation, offsets[0], best_x)
+
+    # Overrides parent's "abstract" method
+    def calculate_placement(self, board, current_tile, next_tile, offsets, board_hash=None) -> Tuple[int, int, int]:
+        """
+        Calculate the best placement based on the agent's prediction
+
+        :param board: the current Tetris board
+        :param current_tile: the current Tetris tile
+        :param next_tile: the next Tetris tile (swappable)
+        :param offsets: the current Tetris tile's coordinates
+        :param board_hash: Zobrist hash of the board (optional, calculated if caching)
+        :return: (tile index, rotation, x) of the placement with the best fitness
+        """
         best_fitness = -9999
         best_tile_index = -1
         best_rotation = -1
         best_x = -1
 
         tiles = [current_tile, next_tile]
+        # Column heights are shared by every candidate placement
+        heights = TUtils.get_col_heights(board)
+        if board_hash is None and self.feature_cache is not None:
+            board_hash = TUtils.get_board_hash(board)
         # 2 tiles: current and next (swappable)
         for tile_index in range(len(tiles)):
-            tile = tiles[tile_index]
-            # Rotation: 0-3 times (4x is the same as 0x)
-            for rotation_count in range(0, 4):
+            # Rotation: each distinct orientation (symmetric tiles have less than 4)
+            for orientation in TUtils.get_tile_orientations(tiles[tile_index]):
+                tile = orientation.shape
                 # X movement
-                for x in range(0, GRID_COL_COUNT - len(tile[0]) + 1):
-                    new_board = TUtils.get_future_board_with_tile(board, tile, (x, offsets[1]), True)
-                    fitness = self.get_fitness(new_board)
+                for x in range(0, GRID_COL_COUNT - orientation.width + 1):
+                    fitness = self.evaluate_placement(board, tile, (x, offsets[1]), heights, board_hash)
                     if fitness > best_fitness:
                         best_fitness = fitness
                         best_tile_index = tile_index
-                        best_rotation = rotation_count
+                        best_rotation = orientation.rotation
                         best_x = x
-                # Rotate tile (prep for next iteration)
-                tile = TUtils.get_rotated_tile(tile)
-
-        ##################################################################################
-        # Obtained best stats, now convert them into sequences of actions
-        # Action = index of { NOTHING, L, R, 2L, 2R, ROTATE, SWAP, FAST_FALL, INSTA_FALL }
-        actions = []
-        if tiles[best_tile_index] != current_tile:
-            actions.append(ACTIONS.index("SWAP"))
-        for _ in range(best_rotation):
-            actions.append(ACTIONS.index("ROTATE"))
-        temp_x = offsets[0]
-        while temp_x != best_x:
-            direction = 1 if temp_x < best_x else -1
-            magnitude = 1 if abs(temp_x - best_x) == 1 else 2
-            temp_x += direction * magnitude
-            actions.append(ACTIONS.index(("" if magnitude == 1 else "2") + ("R" if direction == 1 else "L")))
-        actions.append(ACTIONS.index("INSTA_FALL"))
-        return actions
+
+        return best_tile_index, best_rotation, best_x
 
 
 class GeneticAgentComplete(GeneticAgent):
@@ -153,28 +194,46 @@ class GeneticAgentComplete(GeneticAgent):
 
     def get_fitness(self, board):
         """ Utility method to calculate fitness score """
+        # Extract every feature of the future board (with completed rows cleared) in one pass
+        return self.get_features_fitness(TUtils.get_board_features(board))
+
+    def evaluate_placement(self, board, tile, offsets, heights=None, board_hash=None):
+        """ Fitness score of dropping a tile onto the board, evaluated in place without copying the board """
+        cache = self.feature_cache
+        if cache is None or board_hash is None:
+            return self.get_features_fitness(TUtils.get_placement_features(board, tile, offsets, heights))
+        # Features (not scores) are cached, so agents with different weights share entries
+        key = (board_hash, tile, offsets[0], offsets[1])
+        features = cache.get(key)
+        if features is None:
+            features = TUtils.get_placement_features(board, tile, offsets, heights)
+            cache.put(key, features)
+        return self.get_features_fitness(features)
+
+    def get_features_fitness(self, features):
+        """ Apply weights to board features (see TUtils.get_board_features) """
         score = 0
-        # Check if the board has any completed rows
-        future_board, clear_count = TUtils.get_board_and_lines_cleared(board)
+        aggregate_height, holes, bumpiness, clear_count, _ = features
         # Calculate the line-clear score and apply weights
         score += self.weight_line_clear * clear_count
         # Calculate the aggregate height of future board and apply weights
-        score += self.weight_height * sum(TUtils.get_col_heights(future_board))
+        score += self.weight_height * aggregate_height
         # Calculate the holes score and apply weights
-        score += self.weight_holes * TUtils.get_hole_count(future_board)
+        score += self.weight_holes * holes
         # Calculate the "smoothness" score and apply weights
-        score += self.weight_bumpiness * TUtils.get_bumpiness(future_board)
+        score += self.weight_bumpiness * bumpiness
         # Return the final score
         return score
 
-    def cross_over(self, agent):
+    def cross_over(self, agent, mutation_rate=MUTATION_RATE):
         """
         "Breed" with another agent to produce a "child"
 
         :param agent: the other parent agent
+        :param mutation_rate: chance of each weight being mutated
         :return: "child" agent
         """
-        child = GeneticAgentComplete()
+        child = type(self)()
         # Choose weight randomly from the parents
         child.weight_height = self.weight_height if random.getrandbits(1) else agent.weight_height
         child.weight_holes = self.weight_holes if random.getrandbits(1) else agent.weight_holes
@@ -182,14 +241,266 @@ class GeneticAgentComplete(GeneticAgent):
         child.weight_line_clear = self.weight_line_clear if random.getrandbits(1) else agent.weight_line_clear
 
         # Randomly mutate weights
-        if random.random() < MUTATION_RATE:
+        if random.random() < mutation_rate:
             child.weight_height = TUtils.random_weight()
-        if random.random() < MUTATION_RATE:
+        if random.random() < mutation_rate:
             child.weight_holes = TUtils.random_weight()
-        if random.random() < MUTATION_RATE:
+        if random.random() < mutation_rate:
             child.weight_bumpiness = TUtils.random_weight()
-        if random.random() < MUTATION_RATE:
+        if random.random() < mutation_rate:
             child.weight_line_clear = TUtils.random_weight()
 
         # Return completed child model
         return child
+
+
+class BatchGeneticAgent(GeneticAgentComplete):
+    """ Genetic agent that scores every candidate placement in one NumPy batch """
+
+    # Overrides parent's method, same result as the sequential search
+    def calculate_placement(self, board, current_tile, next_tile, offsets, board_hash=None) -> Tuple[int, int, int]:
+        weights = (self.weight_height, self.weight_holes, self.weight_bumpiness, self.weight_line_clear)
+        if board_hash is None and self.feature_cache is not None:
+            board_hash = TUtils.get_board_hash(board)
+        return TBatch.get_best_placement(board, [current_tile, next_tile], offsets, weights, None, self.feature_cache,
+                                         board_hash)[1:]
+
+
+class SearchStatistics:
+    """ Decision counters of the searching agents, reset with reset_statistics() (e.g. every generation) """
+
+    ##############
+    # Statistics #
+    ##############
+    # Class-level defaults, each agent counts its own decisions once it makes one
+    decision_count = 0
+    evaluation_count = 0
+    decision_time = 0.0
+    # Counted by ExpectimaxAgent only
+    depth_total = 0
+    memo_hits = 0
+
+    def reset_statistics(self):
+        """ Start counting from zero again """
+        self.decision_count = 0
+        self.evaluation_count = 0
+        self.decision_time = 0.0
+        self.depth_total = 0
+        self.memo_hits = 0
+
+    def get_decision_cost(self):
+        """ Average cost of a decision: (evaluated placements, seconds) """
+        count = max(self.decision_count, 1)
+        return self.evaluation_count / count, self.decision_time / count
+
+
+class LookaheadAgent(SearchStatistics, GeneticAgentComplete):
+    """
+    Genetic agent that also plans the follow-up tile: the best <BEAM_WIDTH> first placements are each scored by the
+    best placement of the tile that comes after them
+    """
+
+    # Number of first placements searched further
+    beam_width = LOOKAHEAD_BEAM_WIDTH
+
+    # Overrides parent's method, searches 2 placements deep
+    def calculate_placement(self, board, current_tile, next_tile, offsets, board_hash=None) -> Tuple[int, int, int]:
+        start_time = time.perf_counter()
+        tiles = [current_tile, next_tile]
+        heights = TUtils.get_col_heights(board)
+        if board_hash is None and self.feature_cache is not None:
+            board_hash = TUtils.get_board_hash(board)
+        # First placement: every placement of both tiles, evaluated in place
+        candidates = []
+        for tile_index in range(len(tiles)):
+            for orientation in TUtils.get_tile_orientations(tiles[tile_index]):
+                for x in range(0, GRID_COL_COUNT - orientation.width + 1):
+                    fitness = self.evaluate_placement(board, orientation.shape, (x, offsets[1]), heights, board_hash)
+                    if fitness > -9999:
+                        candidates.append((fitness, tile_index, orientation, x))
+        self.evaluation_count += len(candidates)
+        if not candidates:
+            return -1, -1, -1
+
+        # Beam: only the best first placements are searched further (stable sort keeps the search order on ties)
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        weights = (self.weight_height, self.weight_holes, self.weight_bumpiness, self.weight_line_clear)
+        best_fitness = -9999
+        best_placement = candidates[0][1], candidates[0][2].rotation, candidates[0][3]
+        for _, tile_index, orientation, x in candidates[:self.beam_width]:
+            # Resulting board (a copy, with completed rows cleared)
+            future_board, clear_count, future_hash = TUtils.get_future_board_and_hash(
+                board, orientation.shape, (x, offsets[1]), board_hash, heights)
+            # Follow-up: the next tile, or the current tile if it was swapped out
+            follow_tile = tiles[1 - tile_index]
+            fitness = TBatch.get_best_placement(future_board, [follow_tile], offsets, weights, None, self.feature_cache,
+                                                future_hash)[0]
+            self.evaluation_count += len(TBatch.get_candidate_table([follow_tile])["x"])
+            # Lines cleared by the first placement are not in the follow-up board's features
+            fitness += self.weight_line_clear * clear_count
+            if fitness > best_fitness:
+                best_fitness = fitness
+                best_placement = tile_index, orientation.rotation, x
+
+        self.decision_count += 1
+        self.decision_time += time.perf_counter() - start_time
+        return best_placement
+
+
+class SearchTimeout(Exception):
+    """ Raised inside a search when its time budget runs out """
+
+
+class ExpectimaxAgent(SearchStatistics, GeneticAgentComplete):
+    """
+    Genetic agent that averages over the tiles that can still come out of the current 7-tile bag
+
+    The search places the current (or swapped) tile, then the known next tile, then every tile left in the bag
+    weighted by its count, up to <MAX_DEPTH> tiles deep. Only the best <BEAM_WIDTH> placements of each tile are
+    searched further, and subtrees are memoized by board hash. Depths are searched one after another until the time
+    budget runs out, the placement of the deepest completed search is used (at worst the greedy placement).
+    """
+
+    max_depth = EXPECTIMAX_MAX_DEPTH
+    beam_width = EXPECTIMAX_BEAM_WIDTH
+    time_budget = EXPECTIMAX_TIME_BUDGET
+    # Tiles left in the bag after the next tile, set from the game before each decision (None if unknown)
+    bag = None
+
+    def get_action(self, tetris: Tetris) -> int:
+        if len(self.action_queue) == 0:
+            self.bag = tetris.tile_stream.get_bag_remaining()
+        return super().get_action(tetris)
+
+    def get_placement(self, tetris: Tetris) -> Tuple[int, int, int]:
+        self.bag = tetris.tile_stream.get_bag_remaining()
+        return super().get_placement(tetris)
+
+    # Overrides parent's method, searches deeper while time allows
+    def calculate_placement(self, board, current_tile, next_tile, offsets, board_hash=None) -> Tuple[int, int, int]:
+        start_time = time.perf_counter()
+        self.deadline = start_time + self.time_budget if self.time_budget != -1 else float("inf")
+        self.memo = {}
+        tiles = [current_tile, next_tile]
+        bag = list(TILE_SHAPES.keys()) if self.bag is None else self.bag
+        # Subtrees are memoized (and cached) by board hash, updated incrementally along the search
+        if board_hash is None:
+            board_hash = TUtils.get_board_hash(board)
+
+        # Depth 1: the greedy placement, always available
+        candidates = self.get_candidates(board, tiles, offsets[1], board_hash)
+        if not candidates:
+            return -1, -1, -1
+        best_placement = candidates[0][1], candidates[0][2].rotation, candidates[0][3]
+        depth = 1
+        # Deeper searches: the swapped-out current tile (or the next tile) is placed next, then tiles from the bag
+        for search_depth in range(2, self.max_depth + 1):
+            # Only a completed depth replaces the placement, an interrupted one saw part of the beam only
+            depth_best_value = -9999
+            depth_best = best_placement
+            try:
+                for _, tile_index, orientation, x in candidates[:self.beam_width]:
+                    future_board, clear_count, future_hash = TUtils.get_future_board_and_hash(
+                        board, orientation.shape, (x, offsets[1]), board_hash)
+                    value = self.weight_line_clear * clear_count
+                    value += self.search_tile(future_board, future_hash, tiles[1 - tile_index], bag, search_depth - 1,
+                                              offsets[1])
+                    if value > depth_best_value:
+                        depth_best_value = value
+                        depth_best = tile_index, orientation.rotation, x
+            except SearchTimeout:
+                break
+            best_placement = depth_best
+            depth = search_depth
+
+        self.decision_count += 1
+        self.depth_total += depth
+        self.decision_time += time.perf_counter() - start_time
+        return best_placement
+
+    def get_candidates(self, board, tiles, y, board_hash=None):
+        """ Placements of the given tiles as (fitness, tile index, orientation, x), best first """
+        heights = TUtils.get_col_heights(board)
+        candidates = []
+        for tile_index in range(len(tiles)):
+            for orientation in TUtils.get_tile_orientations(tiles[tile_index]):
+                for x in range(0, GRID_COL_COUNT - orientation.width + 1):
+                    fitness = self.evaluate_placement(board, orientation.shape, (x, y), heights, board_hash)
+                    if fitness > -9999:
+                        candidates.append((fitness, tile_index, orientation, x))
+        self.evaluation_count += len(candidates)
+        # Stable sort keeps the search order on ties
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return candidates
+
+    def search_tile(self, board, board_hash, tile, bag, depth, y):
+        """
+        Value of the best placement of a known tile, followed by <DEPTH> - 1 tiles drawn from the bag
+
+        :param board: the board before placing the tile
+        :param board_hash: Zobrist hash of the board
+        :param tile: tile shape to place
+        :param bag: tiles left in the bag
+        :param depth: number of tiles to place, including this one
+        :param y: y offset the tiles start from
+        :return: fitness of the best resulting board (plus the weighted line clears along the way)
+        """
+        if time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        key = (board_hash, TUtils.get_shape_key(tile), depth, tuple(sorted(bag)))
+        value = self.memo.get(key)
+        if value is not None:
+            self.memo_hits += 1
+            return value
+
+        weights = (self.weight_height, self.weight_holes, self.weight_bumpiness, self.weight_line_clear)
+        if depth == 1:
+            # Leaves are scored in one batch
+            value = TBatch.get_best_placement(board, [tile], (0, y), weights, None, self.feature_cache, board_hash)[0]
+            self.evaluation_count += len(TBatch.get_candidate_table([tile])["x"])
+        else:
+            value = -9999
+            for _, _, orientation, x in self.get_candidates(board, [tile], y, board_hash)[:self.beam_width]:
+                future_board, clear_count, future_hash = TUtils.get_future_board_and_hash(
+                    board, orientation.shape, (x, y), board_hash)
+                value = max(value, self.weight_line_clear * clear_count +
+                            self.search_bag(future_board, future_hash, bag, depth - 1, y))
+        self.memo[key] = value
+        return value
+
+    def search_bag(self, board, board_hash, bag, depth, y):
+        """ Expected value of drawing the next tile from the bag (a new full bag once it is empty) """
+        if not bag:
+            bag = list(TILE_SHAPES.keys())
+        value = 0
+        for tile in sorted(set(bag)):
+            remaining = list(bag)
+            remaining.remove(tile)
+            value += bag.count(tile) * self.search_tile(board, board_hash, TILE_SHAPES[tile], remaining, depth, y)
+        return value / len(bag)
+
+
+def next_generation(agents, scores, mutation_rate=MUTATION_RATE, rounds=None):
+    """
+    Select the best half of the agents and breed them into a new generation of the same size
+
+    :param agents: genetic agents of the current generation
+    :param scores: score of each agent
+    :param mutation_rate: chance of each weight being mutated
+    :param rounds: racing rounds reached by each agent (optional), agents stopped earlier rank lower
+    :return: agents of the next generation, the best agent is kept as the first one
+    """
+    if rounds is None:
+        rounds = [0] * len(agents)
+    # Rank agents by racing round, then by score
+    ranking = sorted(zip(agents, rounds, scores), key=lambda combo: (combo[1], combo[2]), reverse=True)
+    parents = [combo[0] for combo in ranking]
+    # Discard 50% of population
+    parents = parents[:len(agents) // 2]
+    # Keep first place agent
+    children = [parents[0]]
+    # Randomly breed the rest of the agents
+    while len(children) < len(agents):
+        parent1, parent2 = random.sample(parents, 2)
+        children.append(parent1.cross_over(parent2, mutation_rate))
+    return children
@@ -0,0 +1,171 @@
+""" This file provides NumPy-vectorized evaluation of every candidate placement of a decision in one batch """
+
+# Imports
+import numpy as np
+import TetrisUtils as TUtils
+from TetrisSettings import *
+from TetrisBitboard import BitBoard
+
+# Cached candidate tables, see get_candidate_table()
+CANDIDATE_TABLES = {}
+
+
+#######################
+# Candidate Placement #
+#######################
+def build_candidate_table(tiles):
+    """
+    List every placement of the given tiles, in the same order as GeneticAgent.calculate_actions()
+
+    Columns and bottom profiles are padded to 4 entries by repeating the first column (which does not change the
+    landing height), and each placement has exactly 4 blocks since every tile is a tetromino.
+
+    :param tiles: tile shapes, index 0 is the current tile
+    :return: dict of NumPy arrays (tile_index, rotation, x, cols, bottom, cell_y, cell_x), a list of shapes and the
+             shape keys of the tiles
+    """
+    table = {key: [] for key in ["tile_index", "rotation", "x", "cols", "bottom", "cell_y", "cell_x"]}
+    shapes = []
+    for tile_index, tile in enumerate(tiles):
+        for orientation in TUtils.get_tile_orientations(tile):
+            cells = [(y, x) for y, row in enumerate(orientation.shape) for x, val in enumerate(row) if val != 0]
+            padding = 4 - orientation.width
+            for x in range(0, GRID_COL_COUNT - orientation.width + 1):
+                table["tile_index"].append(tile_index)
+                table["rotation"].append(orientation.rotation)
+                table["x"].append(x)
+                table["cols"].append([x + c for c in range(orientation.width)] + [x] * padding)
+                table["bottom"].append(list(orientation.bottom) + [orientation.bottom[0]] * padding)
+                table["cell_y"].append([cy for cy, _ in cells])
+                table["cell_x"].append([x + cx for _, cx in cells])
+                shapes.append(orientation.shape)
+    table = {key: np.array(val, dtype=np.int64) for key, val in table.items()}
+    table["shape"] = shapes
+    table["tiles"] = tuple(TUtils.get_shape_key(tile) for tile in tiles)
+    return table
+
+
+def get_candidate_table(tiles):
+    """ Cached version of build_candidate_table() """
+    key = tuple(TUtils.get_shape_key(tile) for tile in tiles)
+    table = CANDIDATE_TABLES.get(key)
+    if table is None:
+        table = CANDIDATE_TABLES[key] = build_candidate_table(tiles)
+    return table
+
+
+def get_board_array(board):
+    """ Convert a board (2D list or BitBoard) into a boolean NumPy array """
+    if isinstance(board, BitBoard):
+        rows = np.array(board.rows, dtype=np.int64)
+        return ((rows[:, None] >> np.arange(GRID_COL_COUNT)) & 1).astype(bool)
+    return np.array(board, dtype=bool)
+
+
+def get_candidate_boards(board, table, offsets, heights=None):
+    """
+    Build every candidate resulting board as one NumPy stack
+
+    :param board: the current Tetris board
+    :param table: candidate table (see get_candidate_table)
+    :param offsets: x, y offsets of the current tile
+    :param heights: column heights of the board (optional)
+    :return: boolean array of shape (candidates, rows, cols)
+    """
+    if heights is None:
+        heights = TUtils.get_col_heights(board)
+    heights = np.array(heights, dtype=np.int64)
+    # Landing heights from the column heights and bottom profiles
+    landing = (GRID_ROW_COUNT - heights[table["cols"]] - table["bottom"]).min(axis=1) - 1
+    # Tiles below a column's top could be under an overhang, search those row by row
+    for i in np.nonzero(landing < offsets[1])[0]:
+        landing[i] = TUtils.get_effective_height(board, table["shape"][i], (int(table["x"][i]), offsets[1]))
+
+    count = len(landing)
+    boards = np.repeat(get_board_array(board)[None], count, axis=0)
+    boards[np.arange(count)[:, None], landing[:, None] + table["cell_y"], table["cell_x"]] = True
+    return boards
+
+
+######################
+# Fitness Algorithms #
+######################
+def get_batch_features(boards):
+    """
+    Vectorized version of TUtils.get_board_features() for a stack of boards
+
+    :param boards: boolean array of shape (boards, rows, cols)
+    :return: (aggregate heights, hole counts, bumpiness, lines cleared, column heights) as NumPy arrays
+    """
+    full = boards.all(axis=2)
+    kept = ~full
+    # Height of each kept row once completed rows are cleared
+    row_heights = np.cumsum(kept[:, ::-1], axis=1)[:, ::-1]
+    occupied = boards & kept[:, :, None]
+    heights = np.where(occupied, row_heights[:, :, None], 0).max(axis=1)
+    # Empty spaces in kept rows with a block somewhere above them
+    covered = np.logical_or.accumulate(occupied, axis=1)
+    holes = (covered & ~boards & kept[:, :, None]).sum(axis=(1, 2))
+    bumpiness = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+    return heights.sum(axis=1), holes, bumpiness, full.sum(axis=1), heights
+
+
+def get_batch_fitness(features, weights):
+    """
+    Apply weights to batched features, same operation order as GeneticAgentComplete.get_features_fitness()
+
+    :param features: batched features (see get_batch_features)
+    :param weights: (height, holes, bumpiness, line clear) weights
+    :return: fitness score of each board
+    """
+    aggregate_height, holes, bumpiness, clear_count, _ = features
+    weight_height, weight_holes, weight_bumpiness, weight_line_clear = weights
+    score = weight_line_clear * clear_count.astype(np.float64)
+    score += weight_height * aggregate_height
+    score += weight_holes * holes
+    score += weight_bumpiness * bumpiness
+    return score
+
+
+def get_placement_features(board, table, offsets, heights=None, cache=None, board_hash=None):
+    """
+    Batched features (see get_batch_features) of every placement of a candidate table
+
+    :param board: the current Tetris board
+    :param table: candidate table (see get_candidate_table)
+    :param offsets: x, y offsets of the current tile
+    :param heights: column heights of the board (optional)
+    :param cache: TetrisCache.FeatureCache shared with the sequential agents, None to disable caching
+    :param board_hash: Zobrist hash of the board (needed for caching)
+    :return: batched features of the candidates, in table order
+    """
+    if cache is None or board_hash is None:
+        return get_batch_features(get_candidate_boards(board, table, offsets, heights))
+    key = (board_hash, table["tiles"], offsets[1])
+    features = cache.get(key)
+    if features is None:
+        features = get_batch_features(get_candidate_boards(board, table, offsets, heights))
+        cache.put(key, features)
+    return features
+
+
+def get_best_placement(board, tiles, offsets, weights, heights=None, cache=None, board_hash=None):
+    """
+    Score every placement of the given tiles in one batch and pick the best one
+
+    :param board: the current Tetris board
+    :param tiles: tile shapes, index 0 is the current tile
+    :param offsets: x, y offsets of the current tile
+    :param weights: (height, holes, bumpiness, line clear) weights
+    :param heights: column heights of the board (optional)
+    :param cache: TetrisCache.FeatureCache of the batched features, None to disable caching
+    :param board_hash: Zobrist hash of the board (needed for caching)
+    :return: (fitness, tile index, rotation, x); same as GeneticAgent.calculate_actions() picks
+    """
+    table = get_candidate_table(tiles)
+    scores = get_batch_fitness(get_placement_features(board, table, offsets, heights, cache, board_hash), weights)
+    best = int(np.argmax(scores))
+    # Mirror the -9999 starting fitness of the sequential search
+    if not scores[best] > -9999:
+        return -9999, -1, -1, -1
+    return float(scores[best]), int(table["tile_index"][best]), int(table["rotation"][best]), int(table["x"][best])
@@ -0,0 +1,225 @@
+""" This file provides a bitboard Tetris board where each row is stored as an integer bitmask """
+
+# Imports
+from TetrisSettings import *
+from TetrisZobrist import ROW_KEYS, get_board_hash, get_cleared_hash
+
+# Bitmask of a row where every column is filled
+# Column x is stored as bit x (1 << x)
+FULL_MASK = (1 << GRID_COL_COUNT) - 1
+
+
+#####################
+# Tile Mask Helpers #
+#####################
+def get_shape_key(tile_shape):
+    """ Hashable key of a tile shape (list of lists or tuple of tuples) """
+    return tuple(map(tuple, tile_shape))
+
+
+def build_tile_masks(tile_shape):
+    """
+    Convert a tile shape into row masks
+
+    :param tile_shape: tile shape (2D list)
+    :return: (row masks, tile width)
+    """
+    masks = tuple(sum(1 << x for x, val in enumerate(row) if val != 0) for row in tile_shape)
+    return masks, len(tile_shape[0])
+
+
+def build_tile_mask_table():
+    """ Precompute the row masks of every (tile, rotation) pair """
+    table = {}
+    for tile, shape in TILE_SHAPES.items():
+        for rotation in range(4):
+            table[(tile, rotation)] = build_tile_masks(shape)
+            shape = list(zip(*reversed(shape)))
+    return table
+
+
+# Row masks of every (tile, rotation) pair: {(tile, rotation): (masks, width)}
+TILE_MASKS = build_tile_mask_table()
+# Row masks indexed by tile shape, so arbitrary shapes can be looked up quickly
+SHAPE_MASKS = {}
+
+
+def get_tile_masks(tile_shape):
+    """ Obtain the (row masks, width) of a tile shape, computing and caching it if it's not known yet """
+    key = get_shape_key(tile_shape)
+    masks = SHAPE_MASKS.get(key)
+    if masks is None:
+        masks = SHAPE_MASKS[key] = build_tile_masks(tile_shape)
+    return masks
+
+
+def count_bits(value):
+    """ Number of set bits in an integer """
+    return bin(value).count("1")
+
+
+# Warm the shape lookup with every precomputed rotation
+for _tile, _rotation in TILE_MASKS:
+    _shape = TILE_SHAPES[_tile]
+    for _ in range(_rotation):
+        _shape = list(zip(*reversed(_shape)))
+    SHAPE_MASKS[get_shape_key(_shape)] = TILE_MASKS[(_tile, _rotation)]
+
+
+class BitBoard:
+    """
+    Tetris board that stores each row as an integer bitmask
+
+    A parallel color grid is kept so that the board can still be drawn and printed. Iterating over (or indexing) a
+    BitBoard yields the color rows, so read-only code written for the 2D list board keeps working. All writes must go
+    through add_tile() / clear_lines() to keep the masks and colors in sync.
+    """
+
+    def __init__(self, rows=None, cells=None, board_hash=None):
+        # Occupancy bitmask of each row (top to bottom)
+        self.rows = [0] * GRID_ROW_COUNT if rows is None else rows
+        # Color value of each cell (same layout as the 2D list board)
+        self.cells = [[0] * GRID_COL_COUNT for _ in range(GRID_ROW_COUNT)] if cells is None else cells
+        # Zobrist hash of the occupancy, kept up to date by every write
+        self.hash = get_board_hash(self.rows) if board_hash is None else board_hash
+
+    @classmethod
+    def from_list(cls, board):
+        """ Build a BitBoard from a 2D list board """
+        rows = [sum(1 << x for x, val in enumerate(row) if val != 0) for row in board]
+        return cls(rows, [list(row) for row in board])
+
+    def copy(self):
+        """ Fast copy of this board """
+        return BitBoard(self.rows[:], [row[:] for row in self.cells], self.hash)
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.cells)
+
+    def __getitem__(self, index):
+        return self.cells[index]
+
+    ###################
+    # Board Functions #
+    ###################
+    def check_collision(self, tile_shape, offsets):
+        """ Whether the tile collides with existing blocks or the board boundaries """
+        masks, width = get_tile_masks(tile_shape)
+        offset_x, offset_y = offsets
+        if offset_x < 0 or offset_x + width > GRID_COL_COUNT or offset_y + len(masks) > GRID_ROW_COUNT:
+            return True
+        rows = self.rows
+        for cy, mask in enumerate(masks):
+            if rows[cy + offset_y] & (mask << offset_x):
+                return True
+        return False
+
+    def add_tile(self, tile_shape, offsets):
+        """ Lock the tile onto the board """
+        masks, _ = get_tile_masks(tile_shape)
+        offset_x, offset_y = offsets
+        for cy, mask in enumerate(masks):
+            row = self.rows[cy + offset_y]
+            self.rows[cy + offset_y] = new_row = row | (mask << offset_x)
+            self.hash ^= ROW_KEYS[cy + offset_y][row] ^ ROW_KEYS[cy + offset_y][new_row]
+        for cy, row in enumerate(tile_shape):
+            cells = self.cells[cy + offset_y]
+            for cx, val in enumerate(row):
+                if val != 0:
+                    cells[cx + offset_x] = val
+
+    def remove_tile(self, tile_shape, offsets):
+        """ Remove a tile that was added with add_tile() """
+        masks, _ = get_tile_masks(tile_shape)
+        offset_x, offset_y = offsets
+        for cy, mask in enumerate(masks):
+            row = self.rows[cy + offset_y]
+            self.rows[cy + offset_y] = new_row = row & ~(mask << offset_x)
+            self.hash ^= ROW_KEYS[cy + offset_y][row] ^ ROW_KEYS[cy + offset_y][new_row]
+        for cy, row in enumerate(tile_shape):
+            cells = self.cells[cy + offset_y]
+            for cx, val in enumerate(row):
+                if val != 0:
+                    cells[cx + offset_x] = 0
+
+    def clear_lines(self):
+        """
+        Remove completed rows and insert empty rows on top
+
+        :return: number of rows cleared
+        """
+        kept = [y for y, row in enumerate(self.rows) if row != FULL_MASK]
+        cleared = GRID_ROW_COUNT - len(kept)
+        if cleared:
+            self.hash = get_cleared_hash(self.hash, self.rows)
+            self.rows = [0] * cleared + [self.rows[y] for y in kept]
+            self.cells = [[0] * GRID_COL_COUNT for _ in range(cleared)] + [self.cells[y] for y in kept]
+        return cleared
+
+    def flattened(self):
+        """ Copy of this board with every color replaced by 1 """
+        return BitBoard(self.rows[:], [[int(val != 0) for val in row] for row in self.cells], self.hash)
+
+    #####################
+    # Fitness Functions #
+    #####################
+    def get_features(self):
+        """
+        Every fitness feature of the board (after clearing completed rows) in a single pass
+
+        :return: (aggregate height, hole count, bumpiness, lines cleared, column heights)
+        """
+        # Completed rows are skipped, which is the same as clearing them
+        rows = [row for row in self.rows if row != FULL_MASK]
+        row_count = len(rows)
+        heights = [0] * GRID_COL_COUNT
+        holes = 0
+        seen = 0
+        for neg_height, row in enumerate(rows):
+            if seen:
+                holes += count_bits(seen & ~row)
+            new = row & ~seen
+            while new:
+                low = new & -new
+                heights[low.bit_length() - 1] = row_count - neg_height
+                new ^= low
+            seen |= row
+        bumpiness = 0
+        for i in range(1, GRID_COL_COUNT):
+            bumpiness += abs(heights[i - 1] - heights[i])
+        return sum(heights), holes, bumpiness, len(self.rows) - row_count, heights
+
+    def get_col_heights(self):
+        """ Height of each column """
+        heights = [0] * GRID_COL_COUNT
+        seen = 0
+        for neg_height, row in enumerate(self.rows):
+            new = row & ~seen
+            while new:
+                low = new & -new
+                heights[low.bit_length() - 1] = GRID_ROW_COUNT - neg_height
+                new ^= low
+            seen |= row
+            if seen == FULL_MASK:
+                break
+        return heights
+
+    def get_hole_count(self):
+        """ Count of empty spaces below covers """
+        holes = 0
+        seen = 0
+        for row in self.rows:
+            holes += count_bits(seen & ~row)
+            seen |= row
+        return holes
+
+    def get_bumpiness(self):
+        """ Unevenness of the board """
+        heights = self.get_col_heights()
+        return sum(abs(heights[i - 1] - heights[i]) for i in range(1, GRID_COL_COUNT))
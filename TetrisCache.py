@@ -0,0 +1,83 @@
+""" This file provides a bounded LRU cache of board features for placement evaluations """
+
+# Imports
+import sys
+from collections import OrderedDict
+
+
+def get_entry_size(key, features):
+    """ Rough memory footprint (bytes) of one cache entry, including the dictionary slot """
+    size = sys.getsizeof(key) + sys.getsizeof(features)
+    # Small feature counts are shared int objects, column heights (lists or NumPy arrays) are not
+    size += sum(sys.getsizeof(val) for val in features if not isinstance(val, int))
+    size += sum(sys.getsizeof(val) for val in key if isinstance(val, int))
+    return size + 100
+
+
+class FeatureCache:
+    """
+    Bounded LRU cache of placement features keyed by (board hash, tile shape, x, y), and of batched features (see
+    TBatch.get_best_placement) keyed by (board hash, tile shapes, y)
+
+    Features (see TUtils.get_board_features) are stored instead of weighted scores, so entries can be shared by agents
+    with different weights. The least recently used entries are evicted once <MAX_MEMORY> bytes are used.
+    """
+
+    def __init__(self, max_memory: int = 64 * 1024 * 1024):
+        self.max_memory = max_memory
+        self.memory = 0
+        self.entries = OrderedDict()
+
+        ##############
+        # Statistics #
+        ##############
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """ Cached features of <KEY>, or None if not cached """
+        features = self.entries.get(key)
+        if features is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return features
+
+    def put(self, key, features):
+        """ Cache the features of <KEY>, evicting the least recently used entries if the cache is full """
+        # Entries are sized when added and removed (only on misses), single and batched entries differ in size
+        old_features = self.entries.pop(key, None)
+        if old_features is not None:
+            self.memory -= get_entry_size(key, old_features)
+        self.entries[key] = features
+        self.memory += get_entry_size(key, features)
+        while self.memory > self.max_memory and len(self.entries) > 1:
+            old_key, old_features = self.entries.popitem(last=False)
+            self.memory -= get_entry_size(old_key, old_features)
+            self.evictions += 1
+
+    def clear(self):
+        """ Removes every entry and resets the statistics """
+        self.entries.clear()
+        self.memory = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get_stats(self):
+        """ Cache statistics as a dictionary """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "memory": self.memory,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def pop_stats(self):
+        """ Cache statistics (see get_stats) since the last call, the hit, miss and eviction counts start over """
+        stats = self.get_stats()
+        self.hits = self.misses = self.evictions = 0
+        return stats
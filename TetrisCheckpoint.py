@@ -0,0 +1,90 @@
+""" This file saves and restores training runs as compact NumPy (.npz) checkpoints, written in the background """
+
+# Imports
+import os
+import json
+import random
+import threading
+import numpy as np
+from TetrisPopulation import Population
+
+
+def get_checkpoint(population: Population, generation: int, top_score: float, score_history):
+    """
+    Snapshot of a training run, safe to write while the run goes on
+
+    :param population: population of the run
+    :param generation: next generation to play
+    :param top_score: best score of all time
+    :param score_history: best score of each generation played
+    :return: dict of NumPy arrays
+    """
+    version, state, gauss = random.getstate()
+    return {
+        "weights": population.weights.copy(),
+        "generation": np.array(generation),
+        "top_score": np.array(top_score),
+        "score_history": np.array(score_history, dtype=np.float64),
+        # Python random state (tile seeds), NaN if no Gaussian value is cached
+        "random_version": np.array(version),
+        "random_state": np.array(state, dtype=np.uint32),
+        "random_gauss": np.array(np.nan if gauss is None else gauss),
+        # NumPy generator state (breeding), its integers are too big for any NumPy integer type
+        "numpy_state": np.array(json.dumps(population.rng.bit_generator.state)),
+    }
+
+
+def write_checkpoint(path: str, checkpoint):
+    """ Write a checkpoint atomically: the file at <PATH> is either the previous or the new checkpoint """
+    temp_path = path + ".tmp"
+    # Pass a file object, np.savez would add ".npz" to the temporary name
+    with open(temp_path, "wb") as file:
+        np.savez(file, **checkpoint)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path: str):
+    """ Read a checkpoint into a dict of NumPy arrays """
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def restore_checkpoint(checkpoint, agent_class):
+    """
+    Restore a training run, including the random states
+
+    :param checkpoint: checkpoint (see load_checkpoint)
+    :param agent_class: PopulationAgent (sub)class of the agents
+    :return: (population, next generation to play, best score of all time, best score of each generation played)
+    """
+    weights = checkpoint["weights"]
+    population = Population(len(weights), agent_class)
+    population.weights[:] = weights
+    population.rng.bit_generator.state = json.loads(str(checkpoint["numpy_state"]))
+    gauss = float(checkpoint["random_gauss"])
+    random.setstate((int(checkpoint["random_version"]), tuple(checkpoint["random_state"].tolist()),
+                     None if np.isnan(gauss) else gauss))
+    return (population, int(checkpoint["generation"]), float(checkpoint["top_score"]),
+            checkpoint["score_history"].tolist())
+
+
+class CheckpointWriter:
+    """ Writes checkpoints on a background thread, so training does not wait for the disk """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.thread = None
+
+    def save(self, checkpoint):
+        """ Start writing <CHECKPOINT> (see get_checkpoint), once the previous write is done """
+        self.wait()
+        self.thread = threading.Thread(target=write_checkpoint, args=(self.path, checkpoint), daemon=True)
+        self.thread.start()
+
+    def wait(self):
+        """ Wait for the current write (if any) to finish """
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,398 @@
+""" This file runs the genetic training loop of TetrisParallel without any display (no PyGame) """
+
+# Imports
+import os
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from Tetris import Tetris
+from TetrisSettings import *
+from TetrisCache import FeatureCache
+from TetrisRacing import RacingScheduler
+from TetrisAgents import GeneticAgent, SearchStatistics
+from TetrisPopulation import Population, PopulationAgent, BatchPopulationAgent, LookaheadPopulationAgent, \
+    ExpectimaxPopulationAgent
+import TetrisCheckpoint as TCheckpoint
+import TetrisReplay as TReplay
+import TetrisRecorder as TRecorder
+import TetrisProfiler as TProfiler
+
+# Agent classes that can be trained
+AGENT_CLASSES = {
+    "complete": PopulationAgent,
+    "batch": BatchPopulationAgent,
+    "lookahead": LookaheadPopulationAgent,
+    "expectimax": ExpectimaxPopulationAgent,
+}
+
+
+def play_generation(games, agents, time_limit=1000, macro=False, tile_seeds=None, race=None, extra_seed=None,
+                    video_name=None):
+    """
+    Play one generation: step every game with its agent until all games are over or time's up
+
+    Uses the same frame counting as TetrisParallel.update(). In <MACRO> mode each frame places a whole tile with
+    Tetris.place() instead of executing one action.
+
+    :param games: Tetris instances, reset before playing
+    :param agents: agent of each game
+    :param time_limit: maximum number of frames, -1 for no limit
+    :param macro: whether to play placement by placement
+    :param tile_seeds: tile stream seed of each game (None to keep the current streams going)
+    :param race: racing scheduler of the games, reset before playing (None to play every game to the end)
+    :param extra_seed: tile seed of the extra racing episodes
+    :param video_name: record the first episode of game #0 as a clip of this name (see TetrisRecorder), None to
+                       record nothing
+    :return: number of frames played
+    """
+    for a, (tetris, agent) in enumerate(zip(games, agents)):
+        tetris.reset_game(None if tile_seeds is None else tile_seeds[a])
+        # Surviving agents could still have actions queued from the previous generation
+        agent.action_queue = []
+    if race is None:
+        race = RacingScheduler(len(games), time_limit, checkpoints=[], extra_episodes=False)
+    race.reset(extra_seed)
+    if video_name is not None:
+        TRecorder.start_clip(video_name)
+        TRecorder.add_frame(games[0])
+    while not race.update(games, agents):
+        for a, (tetris, agent) in enumerate(zip(games, agents)):
+            # If game over (or stopped by racing), ignore
+            if not race.is_running(games, a):
+                continue
+            if macro:
+                tetris.play_placement(*agent.get_placement(tetris))
+            else:
+                tetris.step(agent.get_action(tetris))
+            # Extra racing episodes restart the game, the clip shows the first episode only
+            if a == 0 and video_name is not None and race.episode == 0:
+                TRecorder.add_frame(tetris)
+    if video_name is not None:
+        TRecorder.end_clip()
+    return race.total_frames
+
+
+def evaluate_agents(agents, time_limit=1000, macro=False, tile_seeds=None, cache_memory=0, racing=False,
+                    extra_seed=None, record=False, video_name=None):
+    """
+    Play one complete generation of games for <AGENTS> (runs in pool workers)
+
+    :param agents: agents to evaluate, one game each
+    :param time_limit: maximum number of frames, -1 for no limit
+    :param macro: whether to play placement by placement
+    :param tile_seeds: tile stream seed of each game (workers would otherwise share the parent's random state)
+    :param cache_memory: memory cap (bytes) of the placement feature cache of this process, 0 to disable
+    :param racing: whether to stop hopeless games early (see TetrisRacing), racing among <AGENTS> only
+    :param extra_seed: tile seed of the extra racing episodes
+    :param record: whether to record the replay of each game (needs <MACRO> and <TILE_SEEDS>), racing extra episodes
+                   reset the games, so their replays hold the last episode only
+    :param video_name: record the game of the first agent as a clip of this name, None to record nothing
+    :return: ([(score, game over, racing rounds, episodes, stopped early, replay) of each agent], frames played,
+             statistics of this process since the last call, see get_process_stats())
+    """
+    if cache_memory and GeneticAgent.feature_cache is None:
+        GeneticAgent.feature_cache = FeatureCache(cache_memory)
+    # Seeded from the start, so creating the games does not use the global random state
+    games = [Tetris(seed=None if tile_seeds is None else tile_seeds[a], record=record) for a in range(len(agents))]
+    if racing:
+        race = RacingScheduler(len(agents), time_limit)
+    else:
+        race = RacingScheduler(len(agents), time_limit, checkpoints=[], extra_episodes=False)
+    frames = play_generation(games, agents, time_limit, macro, tile_seeds, race, extra_seed, video_name)
+    results = zip(race.get_scores(), games, race.rounds, race.episode_scores, race.stopped)
+    return [(score, tetris.game_over, rounds, len(episodes), stopped, tetris.get_replay() if record else None)
+            for score, tetris, rounds, episodes, stopped in results], frames, get_process_stats()
+
+
+def get_process_stats():
+    """
+    Statistics of this process since the last call
+
+    :return: {"pid": process id, "cache": cache stats or None, "profile": TetrisProfiler stats or None}
+    """
+    cache = GeneticAgent.feature_cache
+    return {"pid": os.getpid(), "cache": cache.pop_stats() if cache is not None else None,
+            "profile": TProfiler.pop_stats() if TProfiler.ENABLED else None}
+
+
+def merge_cache_stats(process_stats, entries):
+    """
+    Feature cache statistics of a generation, summed over the processes that played it
+
+    :param process_stats: statistics of each evaluate_agents() call of the generation
+    :param entries: {process id: (entries, memory)} of every process so far, updated here (caches outlive generations)
+    :return: cache statistics (see TetrisCache.FeatureCache.get_stats), None if no process caches
+    """
+    total = {"hits": 0, "misses": 0, "evictions": 0}
+    for stats in process_stats:
+        if stats["cache"] is None:
+            continue
+        entries[stats["pid"]] = stats["cache"]["entries"], stats["cache"]["memory"]
+        for key in total:
+            total[key] += stats["cache"][key]
+    if not entries:
+        return None
+    lookups = total["hits"] + total["misses"]
+    total["entries"] = sum(count for count, _ in entries.values())
+    total["memory"] = sum(memory for _, memory in entries.values())
+    total["hit_rate"] = total["hits"] / lookups if lookups else 0.0
+    return total
+
+
+def evaluate_population(agents, time_limit=1000, macro=False, executor=None, workers=1, cache_memory=0,
+                        common_tiles=COMMON_TILE_SEQUENCE, racing=False, record=False, video_name=None):
+    """
+    Evaluate every agent, spreading chunks of agents over the <EXECUTOR> process pool (if any)
+
+    Tile seeds are drawn here, so results do not depend on the number of workers. With <COMMON_TILES> every agent
+    plays the same tile sequence (common random numbers), so scores differ by skill rather than by luck. Racing stops
+    games by their rank in the whole population, so it is only done without an <EXECUTOR> (chunks racing separately
+    would make the results depend on the number of workers). With <VIDEO_NAME>, the game of the first agent is
+    recorded.
+
+    :return: ([(score, game over, racing rounds, episodes, stopped early, replay) of each agent], frames played,
+             [statistics of each process call, see get_process_stats()])
+    """
+    if common_tiles:
+        tile_seeds = [random.getrandbits(32)] * len(agents)
+    else:
+        tile_seeds = [random.getrandbits(32) for _ in agents]
+    racing = racing and executor is None
+    extra_seed = random.getrandbits(32) if racing else None
+    if executor is None:
+        results, frames, stats = evaluate_agents(agents, time_limit, macro, tile_seeds, cache_memory, racing,
+                                                 extra_seed, record, video_name)
+        return results, frames, [stats]
+    chunk_size = -(-len(agents) // workers)
+    futures = [executor.submit(evaluate_agents, agents[a:a + chunk_size], time_limit, macro,
+                               tile_seeds[a:a + chunk_size], cache_memory, racing, extra_seed, record,
+                               video_name if a == 0 else None)
+               for a in range(0, len(agents), chunk_size)]
+    results, frames, process_stats = [], 0, []
+    for future in futures:
+        chunk_results, chunk_frames, chunk_stats = future.result()
+        results += chunk_results
+        frames = max(frames, chunk_frames)
+        process_stats.append(chunk_stats)
+    return results, frames, process_stats
+
+
+def init_worker(frame_queue, profile):
+    """ Pool worker initializer: send frames to the recorder's <FRAME_QUEUE> (if any), instrument if <PROFILE> """
+    if frame_queue is not None:
+        TRecorder.set_queue(frame_queue)
+    if profile:
+        TProfiler.enable()
+
+
+def get_generation_stats(results):
+    """
+    Statistics shown by TetrisParallel: (best score, best game indexes, survivor count)
+
+    Survivors are the games that are neither over nor stopped by racing (see get_racing_stats for those).
+    """
+    scores = [result[0] for result in results]
+    best_score = max(scores)
+    best_indexes = [a for a, score in enumerate(scores) if score == best_score]
+    survivor = len([result for result in results if not result[1] and not result[4]])
+    return best_score, best_indexes, survivor
+
+
+def get_racing_stats(results):
+    """ Racing statistics: (number of games stopped early, number of agents given an extra episode) """
+    stopped = len([result for result in results if result[4]])
+    extra = len([result for result in results if result[3] > 1])
+    return stopped, extra
+
+
+def run(game_count=40, generations=-1, time_limit=1000, mutation_rate=MUTATION_RATE, agent="complete", macro=False,
+        seed=None, workers=0, cache_memory=0, common_tiles=COMMON_TILE_SEQUENCE, racing=bool(RACING_CHECKPOINTS),
+        checkpoint_path=CHECKPOINT_PATH, checkpoint_interval=CHECKPOINT_INTERVAL, resume=False, replay_path=None,
+        video_path=None, profile=PROFILING):
+    """
+    Run the genetic training loop headlessly
+
+    :param game_count: number of games (and agents) per generation
+    :param generations: number of generations to run, -1 to run forever
+    :param time_limit: maximum number of frames per generation, -1 for no limit
+    :param mutation_rate: chance of each weight being mutated
+    :param agent: agent class name (see AGENT_CLASSES)
+    :param macro: whether to play placement by placement
+    :param seed: random seed
+    :param workers: number of worker processes evaluating the agents, 0 to play in this process
+    :param cache_memory: memory cap (bytes) of the placement feature cache of each process, 0 to disable
+    :param common_tiles: whether every agent of a generation plays the same tile sequence
+    :param racing: whether to stop hopeless games early and replay the best agents (see TetrisRacing), only without
+                   <WORKERS>
+    :param checkpoint_path: checkpoint file of the run
+    :param checkpoint_interval: generations between checkpoints, 0 to disable
+    :param resume: whether to resume the run from <CHECKPOINT_PATH> (if it exists)
+    :param replay_path: file to append the replay of each generation's best game to (needs <MACRO>), None for none
+    :param video_path: directory to record the game of the previous generation's best agent to, None for none
+    :param profile: whether to count and time the hot paths (see TetrisProfiler), summed over the worker processes
+    :return: agents of the last generation
+    """
+    if seed is not None:
+        random.seed(seed)
+    generation = 1
+    top_score = 0.0
+    score_history = []
+    if resume and os.path.exists(checkpoint_path):
+        start_time = time.perf_counter()
+        population, generation, top_score, score_history = TCheckpoint.restore_checkpoint(
+            TCheckpoint.load_checkpoint(checkpoint_path), AGENT_CLASSES[agent])
+        game_count = len(population)
+        print(f">> Resumed {game_count} headless Tetris agents at generation #{generation} from {checkpoint_path} "
+              f"in {(time.perf_counter() - start_time) * 1000:.1f}ms")
+    else:
+        print(f">> Initializing {game_count} headless Tetris agents...")
+        population = Population(game_count, AGENT_CLASSES[agent], random.getrandbits(32))
+    agents = population.agents
+    time_budget = getattr(AGENT_CLASSES[agent], "time_budget", -1)
+    if time_budget != -1:
+        print(f">> Search time budget of {time_budget}s per move: moves depend on the machine's speed, this run (and "
+              f"its checkpoints and replays) cannot be reproduced from its seed")
+    writer = TCheckpoint.CheckpointWriter(checkpoint_path)
+    assert replay_path is None or macro, "Replays are recorded placement by placement, use macro mode"
+    # The best agent of each generation is kept as the first agent of the next one, its games are recorded
+    recorder = None
+    if video_path is not None:
+        print(f">> Recording the best agent's games to {video_path}...")
+        recorder = TRecorder.Recorder(video_path)
+    if profile:
+        TProfiler.enable()
+    executor = None
+    # Feature cache size of each process, see merge_cache_stats()
+    cache_entries = {}
+    if workers > 0:
+        print(f">> Starting {workers} worker process(es)...")
+        if racing:
+            print(">> Racing needs the whole population in one process, it is off with worker processes")
+            racing = False
+        executor = ProcessPoolExecutor(workers, initializer=init_worker,
+                                       initargs=(recorder.queue if recorder is not None else None, profile))
+
+    # The recorder process and the workers are stopped even if training is interrupted (e.g. Ctrl+C)
+    try:
+        while generations == -1 or generation <= generations:
+            TProfiler.pop_stats()
+            # Agents outlive their generation, count the decisions of this generation only
+            for searcher in agents:
+                if isinstance(searcher, SearchStatistics):
+                    searcher.reset_statistics()
+            start_time = time.perf_counter()
+            video_name = f"generation_{generation:05d}" if recorder is not None else None
+            results, frames, process_stats = evaluate_population(agents, time_limit, macro, executor, workers,
+                                                                 cache_memory, common_tiles, racing,
+                                                                 replay_path is not None, video_name)
+            elapsed = time.perf_counter() - start_time
+
+            best_score, best_indexes, survivor = get_generation_stats(results)
+            if best_score > top_score:
+                top_score = best_score
+            score_history.append(best_score)
+            if replay_path is not None:
+                TReplay.write_replays(replay_path, [results[best_indexes[0]][5]])
+            best_agent = agents[best_indexes[0]]
+            print(f">> Generation #{generation}: H.Score: {best_score:.1f}, All Time H.S: {top_score:.1f}, "
+                  f"Survivors: {survivor}/{game_count} ({survivor / game_count * 100:.1f}%), "
+                  f"Frames: {frames}, Time: {elapsed:.2f}s")
+            print(f">> Best Agent #{best_indexes[0]}: Agg Height: {best_agent.weight_height:.2f}, "
+                  f"Hole Count: {best_agent.weight_holes:.2f}, Bumpiness: {best_agent.weight_bumpiness:.2f}, "
+                  f"Line Clear: {best_agent.weight_line_clear:.2f}")
+            if racing:
+                stopped, extra = get_racing_stats(results)
+                print(f">> Racing: {stopped} game(s) stopped early, {extra} agent(s) replayed")
+            # Decision costs are only known when playing in this process
+            searchers = [searcher for searcher in agents if isinstance(searcher, SearchStatistics)]
+            decisions = sum(searcher.decision_count for searcher in searchers)
+            if executor is None and decisions > 0:
+                evaluations = sum(searcher.evaluation_count for searcher in searchers)
+                decision_time = sum(searcher.decision_time for searcher in searchers)
+                print(f">> Search: {decisions} decisions, {evaluations / decisions:.0f} placements and "
+                      f"{decision_time / decisions * 1000:.2f}ms per decision")
+            depths = sum(searcher.depth_total for searcher in searchers)
+            if executor is None and depths > 0:
+                memo_hits = sum(searcher.memo_hits for searcher in searchers)
+                print(f">> Expectimax: average depth {depths / decisions:.2f}, {memo_hits} memoized subtrees reused")
+            if profile:
+                # Timers of every process, their shares are of the time all workers had (up to 100% each)
+                stats = TProfiler.merge_stats(process["profile"] for process in process_stats if process["profile"])
+                placement_rate, evaluation_rate = TProfiler.get_rates(stats, elapsed)
+                timer_rows = TProfiler.get_timer_rows(stats, elapsed * max(workers, 1))
+                print(f">> Profile: {stats.get('lock', (0, 0))[0]} placements ({placement_rate:.0f}/s), "
+                      f"{stats.get('evaluation', (0, 0))[0] + stats.get('batch', (0, 0))[0]} evaluations "
+                      f"({evaluation_rate:.0f}/s)")
+                print(">> Timers: " + SEP.join(f"{label} {seconds:.2f}s ({share * 100:.0f}%, {calls} calls)"
+                                               for label, calls, seconds, share in timer_rows))
+            # Cache statistics of this generation, summed over the worker processes
+            stats = merge_cache_stats(process_stats, cache_entries)
+            if stats is not None:
+                print(f">> Feature Cache: {stats['entries']} entries ({stats['memory'] / 1024 / 1024:.1f}MB), "
+                      f"Hit Rate: {stats['hit_rate'] * 100:.1f}%, Hits: {stats['hits']}, Misses: {stats['misses']}, "
+                      f"Evictions: {stats['evictions']}")
+
+            # Select best one and cross over
+            agents = population.next_generation([result[0] for result in results], mutation_rate,
+                                                [result[2] for result in results])
+            generation += 1
+            if checkpoint_interval > 0 and (generation - 1) % checkpoint_interval == 0:
+                writer.save(TCheckpoint.get_checkpoint(population, generation, top_score, score_history))
+    finally:
+        writer.wait()
+        if executor is not None:
+            executor.shutdown()
+        if recorder is not None:
+            recorder.close()
+    return agents
+
+
+def build_parser(description="Train genetic Tetris agents without a display", run_options=True):
+    """
+    Command line options of the headless training runs
+
+    :param description: description of the program
+    :param run_options: whether to add the options only run() supports (workers, checkpoints, replays, video and
+                        profiling)
+    :return: the argument parser
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--games", type=int, default=40, help="number of games (and agents) per generation")
+    parser.add_argument("--generations", type=int, default=-1, help="number of generations, -1 to run forever")
+    parser.add_argument("--time-limit", type=int, default=1000, help="frames per generation, -1 for no limit")
+    parser.add_argument("--mutation-rate", type=float, default=MUTATION_RATE, help="chance of each weight mutating")
+    parser.add_argument("--agent", choices=sorted(AGENT_CLASSES), default="complete", help="agent class to train")
+    parser.add_argument("--macro", action="store_true", help="play a whole tile placement per frame")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--common-tiles", dest="common_tiles", action="store_true", default=COMMON_TILE_SEQUENCE,
+                        help="every agent of a generation plays the same tile sequence")
+    parser.add_argument("--independent-tiles", dest="common_tiles", action="store_false",
+                        help="every agent plays its own tile sequence")
+    parser.add_argument("--no-racing", dest="racing", action="store_false", default=bool(RACING_CHECKPOINTS),
+                        help="play every game of a generation to the end")
+    parser.add_argument("--cache-mb", type=float, default=0, help="placement feature cache size per process, 0 for none")
+    if not run_options:
+        return parser
+    parser.add_argument("--workers", type=int, default=0, help="worker processes evaluating agents, 0 for none")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="checkpoint file of the run")
+    parser.add_argument("--checkpoint-interval", type=int, default=CHECKPOINT_INTERVAL,
+                        help="generations between checkpoints, 0 for none")
+    parser.add_argument("--resume", action="store_true", help="resume the run from its checkpoint file")
+    parser.add_argument("--replays", default=None, help="file to append the best game of each generation to (--macro)")
+    parser.add_argument("--video", default=None, help="directory to record the best agent's game of each generation to")
+    parser.add_argument("--profile", action="store_true", default=PROFILING,
+                        help="count and time the hot paths, reported every generation")
+    return parser
+
+
+def parse_args(args=None):
+    return build_parser().parse_args(args)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    run(arguments.games, arguments.generations, arguments.time_limit, arguments.mutation_rate, arguments.agent,
+        arguments.macro, arguments.seed, arguments.workers, int(arguments.cache_mb * 1024 * 1024),
+        arguments.common_tiles, arguments.racing, arguments.checkpoint, arguments.checkpoint_interval,
+        arguments.resume, arguments.replays, arguments.video, arguments.profile)
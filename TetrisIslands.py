@@ -0,0 +1,169 @@
+""" This file runs an island-model genetic algorithm: one sub-population per process, with periodic migration """
+
+# Imports
+import time
+import random
+import multiprocessing
+from TetrisSettings import *
+from TetrisPopulation import Population, MIN_POPULATION_SIZE
+from TetrisHeadless import AGENT_CLASSES, evaluate_population, get_generation_stats, build_parser
+
+# Island topologies
+TOPOLOGIES = ["ring", "full"]
+
+
+def get_neighbours(island: int, island_count: int, topology: str = ISLAND_TOPOLOGY):
+    """
+    Islands receiving the elites of island #<ISLAND>
+
+    :param island: index of the island
+    :param island_count: number of islands
+    :param topology: "ring" (next island only) or "full" (every other island)
+    :return: list of island indexes
+    """
+    assert topology in TOPOLOGIES, f"Invalid topology, use one of {TOPOLOGIES}"
+    if island_count == 1:
+        return []
+    if topology == "ring":
+        return [(island + 1) % island_count]
+    return [other for other in range(island_count) if other != island]
+
+
+def migrate(population: Population, scores, rounds, island: int, inboxes, topology: str, migrant_count: int):
+    """
+    Send the elites of this island to its neighbours, and receive the elites of the islands sending to it
+
+    Every island sends before receiving, so the blocking reads cannot deadlock. Migrants from lower island indexes
+    come first, so the result does not depend on message timing.
+
+    :param population: population of this island
+    :param scores: score of each agent of the last generation
+    :param rounds: racing rounds reached by each agent of the last generation
+    :param island: index of this island
+    :param inboxes: multiprocessing queue of each island
+    :param topology: "ring" or "full"
+    :param migrant_count: number of elites sent to each neighbour
+    :return: weight rows of the received migrants
+    """
+    island_count = len(inboxes)
+    elites = population.weights[population.select(scores, migrant_count, rounds)].copy()
+    for neighbour in get_neighbours(island, island_count, topology):
+        inboxes[neighbour].put((island, elites))
+    senders = [other for other in range(island_count) if island in get_neighbours(other, island_count, topology)]
+    messages = sorted((inboxes[island].get() for _ in senders), key=lambda message: message[0])
+    return [row for _, rows in messages for row in rows]
+
+
+def run_island(island: int, inboxes, stats_queue, game_count: int, generations: int, time_limit: int,
+               mutation_rate: float, agent: str, macro: bool, seed: int, cache_memory: int, common_tiles: bool,
+               racing: bool, interval: int, migrant_count: int, topology: str):
+    """
+    Evolve the sub-population of island #<ISLAND> (runs in its own process)
+
+    Migrants replace the last rows of the next generation, the best agent (first row) is never replaced. The stats
+    of each generation are sent to <STATS_QUEUE> as (island, generation, best score, survivors, best weights).
+    """
+    random.seed(seed)
+    population = Population(game_count, AGENT_CLASSES[agent], random.getrandbits(32))
+    generation = 1
+    while generations == -1 or generation <= generations:
+        results, _, _ = evaluate_population(population.agents, time_limit, macro, cache_memory=cache_memory,
+                                         common_tiles=common_tiles, racing=racing)
+        scores = [result[0] for result in results]
+        rounds = [result[2] for result in results]
+        best_score, best_indexes, survivor = get_generation_stats(results)
+        stats_queue.put((island, generation, best_score, survivor, population.weights[best_indexes[0]].tolist()))
+
+        migrants = []
+        if interval > 0 and generation % interval == 0:
+            migrants = migrate(population, scores, rounds, island, inboxes, topology, migrant_count)
+        population.next_generation(scores, mutation_rate, rounds)
+        # Keep the elite in the first row
+        migrants = migrants[:game_count - 1]
+        if migrants:
+            population.weights[game_count - len(migrants):] = migrants
+        generation += 1
+
+
+def run(island_count=4, game_count=10, generations=-1, time_limit=1000, mutation_rate=MUTATION_RATE,
+        agent="complete", macro=False, seed=None, cache_memory=0, common_tiles=COMMON_TILE_SEQUENCE,
+        racing=bool(RACING_CHECKPOINTS), interval=ISLAND_MIGRATION_INTERVAL, migrant_count=ISLAND_MIGRANT_COUNT,
+        topology=ISLAND_TOPOLOGY):
+    """
+    Run the island-model genetic training loop, one process per island
+
+    See TetrisHeadless.run() for the parameters not listed here.
+
+    :param island_count: number of islands (processes)
+    :param game_count: number of games (and agents) per island
+    :param interval: generations between migrations, 0 for no migration
+    :param migrant_count: number of elites sent to each neighbouring island
+    :param topology: "ring" or "full"
+    :return: best score of all time
+    """
+    # Checked here, a failed assertion in an island process would leave this one waiting for its stats
+    assert game_count >= MIN_POPULATION_SIZE, \
+        f"Each island needs at least {MIN_POPULATION_SIZE} games (2 parents to breed from), got {game_count}"
+    if seed is not None:
+        random.seed(seed)
+    print(f">> Initializing {island_count} island(s) of {game_count} headless Tetris agents ({topology} topology)...")
+    inboxes = [multiprocessing.Queue() for _ in range(island_count)]
+    stats_queue = multiprocessing.Queue()
+    processes = []
+    for island in range(island_count):
+        process = multiprocessing.Process(
+            target=run_island, daemon=True,
+            args=(island, inboxes, stats_queue, game_count, generations, time_limit, mutation_rate, agent, macro,
+                  random.getrandbits(32), cache_memory, common_tiles, racing, interval, migrant_count, topology))
+        process.start()
+        processes.append(process)
+
+    # Islands run at their own pace, a generation is reported once every island has finished it
+    pending = {}
+    generation = 1
+    top_score = 0.0
+    start_time = time.perf_counter()
+    while generations == -1 or generation <= generations:
+        island, island_generation, best_score, survivor, weights = stats_queue.get()
+        pending.setdefault(island_generation, {})[island] = (best_score, survivor, weights)
+        while len(pending.get(generation, {})) == island_count:
+            stats = pending.pop(generation)
+            best_island = max(range(island_count), key=lambda a: stats[a][0])
+            best_score, _, weights = stats[best_island]
+            survivor = sum(stat[1] for stat in stats.values())
+            if best_score > top_score:
+                top_score = best_score
+            elapsed = time.perf_counter() - start_time
+            migration = " (migration)" if interval > 0 and generation % interval == 0 else ""
+            print(f">> Generation #{generation}{migration}: H.Score: {best_score:.1f} (Island #{best_island}), "
+                  f"All Time H.S: {top_score:.1f}, Survivors: {survivor}/{island_count * game_count}, "
+                  f"Time: {elapsed:.2f}s")
+            print(f">> Island H.Scores: {', '.join(f'{stats[a][0]:.1f}' for a in range(island_count))}")
+            print(f">> Best Agent: Agg Height: {weights[0]:.2f}, Hole Count: {weights[1]:.2f}, "
+                  f"Bumpiness: {weights[2]:.2f}, Line Clear: {weights[3]:.2f}")
+            start_time = time.perf_counter()
+            generation += 1
+
+    for process in processes:
+        process.join()
+    return top_score
+
+
+def parse_args(args=None):
+    # Islands are processes of their own, without checkpoints, replays, recordings or profiling
+    parser = build_parser("Train genetic Tetris agents on islands (one process each) without a display", False)
+    parser.set_defaults(games=10)
+    parser.add_argument("--islands", type=int, default=4, help="number of islands (processes)")
+    parser.add_argument("--migration-interval", type=int, default=ISLAND_MIGRATION_INTERVAL,
+                        help="generations between migrations, 0 for none")
+    parser.add_argument("--migrants", type=int, default=ISLAND_MIGRANT_COUNT, help="elites sent to each neighbour")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default=ISLAND_TOPOLOGY, help="migration topology")
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    run(arguments.islands, arguments.games, arguments.generations, arguments.time_limit, arguments.mutation_rate,
+        arguments.agent, arguments.macro, arguments.seed, int(arguments.cache_mb * 1024 * 1024),
+        arguments.common_tiles, arguments.racing, arguments.migration_interval, arguments.migrants,
+        arguments.topology)
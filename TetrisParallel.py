@@ -1,11 +1,22 @@
 """ This file runs multiple instances of the Tetris class in synchronization with a PyGame display """
 
 # Imports
+import os
+import time
+import random
+import argparse
+import threading
 import pygame
+from typing import NamedTuple
 from Tetris import Tetris
 import TetrisUtils as TUtils
 from TetrisSettings import *
 from TetrisAgents import *
+from TetrisRacing import RacingScheduler
+from TetrisPopulation import Population, PopulationAgent
+import TetrisCheckpoint as TCheckpoint
+import TetrisRender as TRender
+import TetrisProfiler as TProfiler
 
 # >>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
 # Parallel Training Settings
@@ -28,8 +39,8 @@ PADDING_STATS = 300
 SCREEN_WIDTH = GAME_WIDTH * COL_COUNT + PADDING * (COL_COUNT + 1) + PADDING_STATS
 SCREEN_HEIGHT = GAME_HEIGHT * ROW_COUNT + PADDING * (ROW_COUNT + 1)
 
-# Mutation Rate
-MUTATION_RATE = 0.1  # 10% mutation chance
+# Display refresh rate, the simulation thread runs flat out in between
+RENDER_FPS = 30
 
 # End of Settings
 # <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<
@@ -39,8 +50,19 @@ MUTATION_RATE = 0.1  # 10% mutation chance
 ####################
 # List of Tetris instances
 TETRIS_GAMES = []
-# List of agents
+# List of agents (views on the weights of POPULATION)
+POPULATION = None
 AGENTS = []
+# Pre-rendered tile surfaces (see TetrisRender), created once PyGame is initialized
+ATLAS = None
+# Latest snapshot published by the simulation thread, a new one is published when the display asks for it
+LATEST_SNAPSHOT = None
+SNAPSHOT_REQUESTED = threading.Event()
+# Dirty-region redraw: what is on screen (board versions, panel lines, highlights) and the rects changed this frame
+drawn_versions = []
+drawn_lines = {}
+drawn_highlights = []
+dirty_rects = []
 
 ########################
 # Genetics Information #
@@ -49,67 +71,132 @@ AGENTS = []
 gen_generation = 1  # when this is set to -1, genetic agent is not used
 gen_previous_best_score = 0.0
 gen_top_score = 0.0
+gen_score_history = []
+# Hot path profile of the previous generation (panel lines), when PROFILING is enabled
+gen_profile = ()
+gen_start_time = time.perf_counter()
+
+# Saves the run every CHECKPOINT_INTERVAL generations (see TetrisCheckpoint)
+CHECKPOINT_WRITER = TCheckpoint.CheckpointWriter(CHECKPOINT_PATH)
 
 # Set a time limit so no forever games
 time_elapsed = 0
 time_limit = 1000
 
+# Stops hopeless games early and replays the best agents (see TetrisRacing)
+RACE = RacingScheduler(GAME_COUNT, time_limit)
+
+
+class FrameSnapshot(NamedTuple):
+    """ Immutable copy of everything draw() shows, published by the simulation thread """
+    # TUtils.GameSnapshot of each game
+    games: tuple
+    # Whether each game is still racing
+    running: tuple
+    # Weights of each agent, in TetrisPopulation.WEIGHT_NAMES order
+    weights: tuple
+    generation: int
+    time_elapsed: int
+    episode: int
+    previous_best_score: float
+    top_score: float
+    # Panel lines of the previous generation's profile
+    profile: tuple
+
+
+def get_snapshot() -> FrameSnapshot:
+    """ Snapshot of the games and training statistics, only called by the simulation thread """
+    return FrameSnapshot(tuple(tetris.get_snapshot() for tetris in TETRIS_GAMES),
+                         tuple(RACE.is_running(TETRIS_GAMES, a) for a in range(GAME_COUNT)),
+                         tuple(map(tuple, POPULATION.weights.tolist())), gen_generation, time_elapsed, RACE.episode,
+                         gen_previous_best_score, gen_top_score, gen_profile)
+
+
+def simulate():
+    """ Simulation thread: steps the games as fast as possible, independently of the display """
+    while True:
+        update()
+
 
-def update(screen):
-    """ Called every frame by the runner, handles updates each frame """
-    global GAME_COUNT, AGENTS
-    global gen_generation, gen_previous_best_score, gen_top_score
+def update():
+    """ Called every frame by the simulation thread, handles updates each frame """
+    global GAME_COUNT, AGENTS, LATEST_SNAPSHOT
+    global gen_generation, gen_previous_best_score, gen_top_score, gen_profile, gen_start_time
     global time_elapsed, time_limit
-    time_elapsed += 1
 
-    # Check if all agents have reached game over state
-    if all(tetris.game_over for tetris in TETRIS_GAMES) or (time_limit != -1 and time_elapsed % time_limit == 0):
+    # Check if all agents have reached game over state (or were stopped by racing)
+    generation_over = RACE.update(TETRIS_GAMES, AGENTS)
+    time_elapsed = RACE.frame
+    if generation_over:
         time_elapsed = 0
         # Everyone "died" or time's up, select best one and cross over
-        combos = zip(AGENTS, TETRIS_GAMES)
-        parents = sorted(combos, key=lambda combo: combo[1].score, reverse=True)
+        scores = RACE.get_scores()
         # Update generation information
         gen_generation += 1
-        gen_previous_best_score = parents[0][1].score
+        gen_previous_best_score = max(scores)
         if gen_previous_best_score > gen_top_score:
             gen_top_score = gen_previous_best_score
-
-        # Undo zipping
-        parents = [a[0] for a in parents]
-
-        # Discard 50% of population
-        parents = parents[:GAME_COUNT // 2]
-        # Keep first place agent
-        AGENTS = [parents[0]]
-        # Randomly breed the rest of the agents
-        while len(AGENTS) < GAME_COUNT:
-            parent1, parent2 = random.sample(parents, 2)
-            AGENTS.append(parent1.cross_over(parent2))
-
-        # Reset games
+        gen_score_history.append(gen_previous_best_score)
+        if PROFILING:
+            gen_profile = get_profile_lines(TProfiler.pop_stats(), time.perf_counter() - gen_start_time)
+        gen_start_time = time.perf_counter()
+
+        # Discard 50% of population and breed the rest
+        AGENTS = POPULATION.next_generation(scores, MUTATION_RATE, RACE.rounds)
+        # Save the run before drawing the next tile seed, so a resumed run plays the same tiles
+        if CHECKPOINT_INTERVAL > 0 and (gen_generation - 1) % CHECKPOINT_INTERVAL == 0:
+            CHECKPOINT_WRITER.save(TCheckpoint.get_checkpoint(POPULATION, gen_generation, gen_top_score,
+                                                              gen_score_history))
+
+        # Reset games, with the same tile sequence for every game if enabled
+        tile_seed = random.getrandbits(32) if COMMON_TILE_SEQUENCE else None
         for tetris in TETRIS_GAMES:
-            tetris.reset_game()
+            tetris.reset_game(tile_seed)
+        RACE.reset()
 
     for a in range(GAME_COUNT):
-        # If game over, ignore
-        if TETRIS_GAMES[a].game_over:
+        # If game over (or stopped by racing), ignore
+        if not RACE.is_running(TETRIS_GAMES, a):
             continue
         TETRIS_GAMES[a].step(AGENTS[a].get_action(TETRIS_GAMES[a]))
 
-    draw(screen)
-    pygame.event.get()
+    # Publish a snapshot between frames if the display asked for one, the states in between are never copied
+    if SNAPSHOT_REQUESTED.is_set():
+        SNAPSHOT_REQUESTED.clear()
+        LATEST_SNAPSHOT = get_snapshot()
 
 
-def draw(screen):
-    """ Called by the update() function every frame, draws the PyGame GUI """
-    # Background layer
-    screen.fill(TUtils.get_color_tuple(COLORS.get("BACKGROUND_BLACK")))
-
-    # Draw Tetris boards
+def render(screen):
+    """ Display loop (main thread): draws the latest snapshot RENDER_FPS times per second """
+    clock = pygame.time.Clock()
+    while True:
+        SNAPSHOT_REQUESTED.set()
+        clock.tick(RENDER_FPS)
+        if LATEST_SNAPSHOT is not None:
+            draw(screen, LATEST_SNAPSHOT)
+        pygame.event.get()
+
+
+def draw(screen, snapshot: FrameSnapshot):
+    """ Called by render() every frame, redraws the parts of the PyGame GUI that changed since the last snapshot """
+    global drawn_versions, drawn_highlights
+    # Background layer, only drawn on the first frame
+    if len(drawn_versions) != GAME_COUNT:
+        screen.fill(TRender.get_color("BACKGROUND_BLACK"))
+        dirty_rects.append(screen.get_rect())
+        drawn_versions = [-1] * GAME_COUNT
+        drawn_lines.clear()
+        drawn_highlights = []
+
+    # Draw Tetris boards that changed since they were last drawn
     curr_x, curr_y = PADDING, PADDING
     for x in range(ROW_COUNT):
         for y in range(COL_COUNT):
-            draw_board(screen, TETRIS_GAMES[x * COL_COUNT + y], curr_x, curr_y)
+            tetris = snapshot.games[x * COL_COUNT + y]
+            if drawn_versions[x * COL_COUNT + y] != tetris.version:
+                drawn_versions[x * COL_COUNT + y] = tetris.version
+                draw_board(screen, tetris, curr_x, curr_y)
+                dirty_rects.append(pygame.Rect(curr_x, curr_y, GAME_WIDTH, GAME_HEIGHT))
             curr_x += GAME_WIDTH + PADDING
         curr_x = PADDING
         curr_y += GAME_HEIGHT + PADDING
@@ -117,31 +204,36 @@ def draw(screen):
     # Draw statistics
     # Realign starting point to statistics bar
     curr_x, curr_y = GAME_WIDTH * COL_COUNT + PADDING * (COL_COUNT + 1), PADDING
+    lines = {}
 
     # Draw title
-    draw_text("Tetris", screen, (curr_x, curr_y), font_size=48)
+    lines[curr_x, curr_y] = ("Tetris", 48)
     curr_y += 60
     # Draw statistics
-    best_indexes, best_score = get_high_score()
-    draw_text(f"High Score: {best_score:.1f}", screen, (curr_x, curr_y))
+    best_indexes, best_score = get_high_score(snapshot.games)
+    lines[curr_x, curr_y] = (f"High Score: {best_score:.1f}", 16)
     curr_y += 20
-    draw_text(f"Best Agent: {SEP.join(map(str, best_indexes))}", screen, (curr_x, curr_y))
+    lines[curr_x, curr_y] = (f"Best Agent: {SEP.join(map(str, best_indexes))}", 16)
     curr_y += 20
 
     # Draw genetics
-    if gen_generation > -1:
+    highlights = []
+    if snapshot.generation > -1:
         curr_y += 20
-        draw_text(f"Generation #{gen_generation}", screen, (curr_x, curr_y), font_size=24)
+        lines[curr_x, curr_y] = (f"Generation #{snapshot.generation}", 24)
         curr_y += 35
-        draw_text(f"Time Limit: {time_elapsed}/{time_limit}", screen, (curr_x, curr_y))
+        lines[curr_x, curr_y] = (f"Time Limit: {snapshot.time_elapsed}/{time_limit}", 16)
+        curr_y += 20
+        racing = sum(snapshot.running)
+        lines[curr_x, curr_y] = (f"Racing: {racing}/{GAME_COUNT} (Episode #{snapshot.episode + 1})", 16)
         curr_y += 20
 
-        survivor = len([a for a in TETRIS_GAMES if not a.game_over])
-        draw_text(f"Survivors: {survivor}/{GAME_COUNT} ({survivor / GAME_COUNT * 100:.1f}%)", screen, (curr_x, curr_y))
+        survivor = len([a for a in snapshot.games if not a.game_over])
+        lines[curr_x, curr_y] = (f"Survivors: {survivor}/{GAME_COUNT} ({survivor / GAME_COUNT * 100:.1f}%)", 16)
         curr_y += 20
-        draw_text(f"Prev H.Score: {gen_previous_best_score:.1f}", screen, (curr_x, curr_y))
+        lines[curr_x, curr_y] = (f"Prev H.Score: {snapshot.previous_best_score:.1f}", 16)
         curr_y += 20
-        draw_text(f"All Time H.S: {gen_top_score:.1f}", screen, (curr_x, curr_y))
+        lines[curr_x, curr_y] = (f"All Time H.S: {snapshot.top_score:.1f}", 16)
         curr_y += 40
 
         # Display selected agent
@@ -158,25 +250,98 @@ def draw(screen):
             agent_index = best_indexes[0]
 
         if agent_index != -1:
-            draw_text(f"Agent #{agent_index}:", screen, (curr_x, curr_y), font_size=24)
+            weight_height, weight_holes, weight_bumpiness, weight_line_clear = snapshot.weights[agent_index]
+            lines[curr_x, curr_y] = (f"Agent #{agent_index}:", 24)
             curr_y += 35
-            draw_text(f">> Agg Height: {AGENTS[agent_index].weight_height:.1f}", screen, (curr_x, curr_y))
+            lines[curr_x, curr_y] = (f">> Agg Height: {weight_height:.1f}", 16)
             curr_y += 20
-            draw_text(f">> Hole Count: {AGENTS[agent_index].weight_holes:.1f}", screen, (curr_x, curr_y))
+            lines[curr_x, curr_y] = (f">> Hole Count: {weight_holes:.1f}", 16)
             curr_y += 20
-            draw_text(f">> Bumpiness:  {AGENTS[agent_index].weight_bumpiness:.1f}", screen, (curr_x, curr_y))
+            lines[curr_x, curr_y] = (f">> Bumpiness:  {weight_bumpiness:.1f}", 16)
             curr_y += 20
-            draw_text(f">> Line Clear: {AGENTS[agent_index].weight_line_clear:.1f}", screen, (curr_x, curr_y))
+            lines[curr_x, curr_y] = (f">> Line Clear: {weight_line_clear:.1f}", 16)
             curr_y += 20
             if highlight_selected:
-                highlight(screen, selected, mode=1)
+                highlights = [(selected, 1)]
             else:
                 # Highlight current best(s)
-                for a in best_indexes:
-                    highlight(screen, a, mode=0)
+                highlights = [(a, 0) for a in best_indexes]
+
+        # Display the previous generation's profile
+        if snapshot.profile:
+            curr_y += 20
+            lines[curr_x, curr_y] = ("Profile (Prev Gen):", 24)
+            curr_y += 35
+            for line in snapshot.profile:
+                lines[curr_x, curr_y] = (line, 16)
+                curr_y += 20
+
+    draw_lines(screen, lines)
+    # Highlights share the padding between boards, so they are all redrawn when any of them changes
+    if highlights != drawn_highlights:
+        for index, _ in drawn_highlights:
+            dirty_rects.extend(clear_highlight(screen, index))
+        for index, mode in highlights:
+            highlight(screen, index, mode)
+            dirty_rects.extend(get_padding_rects(index))
+        drawn_highlights = highlights
+
+    # Update the changed parts of the display
+    if dirty_rects:
+        pygame.display.update(dirty_rects)
+        dirty_rects.clear()
+
+
+def get_profile_lines(stats, elapsed: float):
+    """ Panel lines of a generation's profile (see TetrisProfiler.pop_stats), <ELAPSED> = generation wall time """
+    placement_rate, evaluation_rate = TProfiler.get_rates(stats, elapsed)
+    profile = [f">> Placements/s: {placement_rate:.0f}", f">> Evaluations/s: {evaluation_rate:.0f}"]
+    for label, calls, seconds, share in TProfiler.get_timer_rows(stats, elapsed):
+        profile.append(f">> {label + ':':<11} {seconds:.2f}s ({share * 100:.0f}%)")
+    return tuple(profile)
+
+
+def draw_lines(screen, lines):
+    """
+    Draw the statistics lines that changed since the last frame, and clear the lines no longer shown
 
-        # Update display
-        pygame.display.update()
+    :param screen: the screen to draw on
+    :param lines: {offsets: (message, font size)} of every line shown this frame
+    """
+    black = TRender.get_color("BACKGROUND_BLACK")
+    for offsets in set(drawn_lines) | set(lines):
+        line = lines.get(offsets)
+        drawn_line, drawn_height = drawn_lines.get(offsets, (None, 0))
+        if line == drawn_line:
+            continue
+        text_image = TRender.get_text(*line) if line is not None else None
+        height = max(drawn_height, text_image.get_height() if text_image is not None else 0)
+        rect = pygame.Rect(offsets[0], offsets[1], SCREEN_WIDTH - offsets[0], height)
+        screen.fill(black, rect)
+        if text_image is not None:
+            screen.blit(text_image, offsets)
+            drawn_lines[offsets] = (line, text_image.get_height())
+        else:
+            del drawn_lines[offsets]
+        dirty_rects.append(rect)
+
+
+def get_padding_rects(index: int):
+    """ Rects of the padding around Tetris grid #<INDEX>, where its highlight is drawn """
+    temp_x = (GAME_WIDTH + PADDING) * (index % COL_COUNT)
+    temp_y = (GAME_HEIGHT + PADDING) * (index // COL_COUNT)
+    return [pygame.Rect(temp_x, temp_y, GAME_WIDTH + PADDING * 2, PADDING),
+            pygame.Rect(temp_x, temp_y + GAME_HEIGHT + PADDING, GAME_WIDTH + PADDING * 2, PADDING),
+            pygame.Rect(temp_x, temp_y, PADDING, GAME_HEIGHT + PADDING * 2),
+            pygame.Rect(temp_x + GAME_WIDTH + PADDING, temp_y, PADDING, GAME_HEIGHT + PADDING * 2)]
+
+
+def clear_highlight(screen, index: int):
+    """ Remove the highlight of Tetris grid #<INDEX>, returns the cleared rects """
+    rects = get_padding_rects(index)
+    for rect in rects:
+        screen.fill(TRender.get_color("BACKGROUND_BLACK"), rect)
+    return rects
 
 
 def highlight(screen, index: int, mode: int):
@@ -189,7 +354,7 @@ def highlight(screen, index: int, mode: int):
     """
     game_x = index % COL_COUNT
     game_y = index // COL_COUNT
-    color = TUtils.get_color_tuple(COLORS.get("HIGHLIGHT_GREEN" if mode == 0 else "HIGHLIGHT_RED"))
+    color = TRender.get_color("HIGHLIGHT_GREEN" if mode == 0 else "HIGHLIGHT_RED")
 
     if mode == 1:
         # Draw previous best (thick border)
@@ -213,14 +378,14 @@ def highlight(screen, index: int, mode: int):
         pygame.draw.rect(screen, color, (temp_x, temp_y, -PADDING / 2, -GAME_HEIGHT - PADDING + 2))
 
 
-def get_high_score():
+def get_high_score(games):
     best_indexes, best_score = [], 0
     for a in range(GAME_COUNT):
         # Ignore dead games
-        if TETRIS_GAMES[a].game_over:
+        if games[a].game_over:
             continue
         # Get score
-        score = TETRIS_GAMES[a].score
+        score = games[a].score
         if score > best_score:
             best_indexes = [a]
             best_score = score
@@ -231,8 +396,7 @@ def get_high_score():
 
 def draw_text(message: str, screen, offsets, font_size=16, color="WHITE"):
     """ Draws a line of text at the specified offsets """
-    text_image = pygame.font.SysFont(FONT_NAME, font_size).render(message, False, TUtils.get_color_tuple(COLORS.get(color)))
-    screen.blit(text_image, offsets)
+    screen.blit(TRender.get_text(message, font_size, color), offsets)
 
 
 def draw_board(screen, tetris: Tetris, x_offset: int, y_offset: int):
@@ -240,31 +404,21 @@ def draw_board(screen, tetris: Tetris, x_offset: int, y_offset: int):
     Draws one Tetris board with offsets, called by draw() multiple times per frame
 
     :param screen: the screen to draw on
-    :param tetris: Tetris instance
+    :param tetris: Tetris instance or TUtils.GameSnapshot
     :param x_offset: X offset (starting X)
     :param y_offset: Y offset (starting Y)
     """
     # [0] Striped background layer
-    for a in range(GRID_COL_COUNT):
-        color = TUtils.get_color_tuple(COLORS.get("BACKGROUND_DARK" if a % 2 == 0 else "BACKGROUND_LIGHT"))
-        pygame.draw.rect(screen, color, (x_offset + a * GAME_GRID_SIZE, y_offset, GAME_GRID_SIZE, GAME_HEIGHT))
-
+    blits = [(ATLAS.background, (x_offset, y_offset))]
     # [1] Board tiles
-    draw_tiles(screen, tetris.board, global_offsets=(x_offset, y_offset))
+    blits += ATLAS.get_tile_blits(tetris.board, global_offsets=(x_offset, y_offset))
     # [1] Current tile
-    draw_tiles(screen, tetris.tile_shape, offsets=(tetris.tile_x, tetris.tile_y), global_offsets=(x_offset, y_offset))
-
+    blits += ATLAS.get_tile_blits(tetris.tile_shape, offsets=(tetris.tile_x, tetris.tile_y),
+                                  global_offsets=(x_offset, y_offset))
     # [2] Game over graphics
     if tetris.game_over:
-        color = TUtils.get_color_tuple(COLORS.get("BACKGROUND_BLACK"))
-        ratio = 0.9
-        pygame.draw.rect(screen, color, (x_offset, y_offset + (GAME_HEIGHT * ratio) / 2, GAME_WIDTH, GAME_HEIGHT * (1 - ratio)))
-
-        message = "GAME OVER"
-        color = TUtils.get_color_tuple(COLORS.get("RED"))
-        text_image = pygame.font.SysFont(FONT_NAME, GAME_WIDTH // 6).render(message, False, color)
-        rect = text_image.get_rect()
-        screen.blit(text_image, (x_offset + (GAME_WIDTH - rect.width) / 2, y_offset + (GAME_HEIGHT - rect.height) / 2))
+        blits.append((ATLAS.game_over, (x_offset, y_offset)))
+    screen.blits(blits, doreturn=False)
 
 
 def draw_tiles(screen, matrix, offsets=(0, 0), global_offsets=(0, 0), outline_only=False):
@@ -277,34 +431,13 @@ def draw_tiles(screen, matrix, offsets=(0, 0), global_offsets=(0, 0), outline_on
     :param global_offsets: global pixel offsets
     :param outline_only: draw prediction outline only?
     """
-    for y, row in enumerate(matrix):
-        for x, val in enumerate(row):
-            if val == 0:
-                continue
-            coord_x = global_offsets[0] + (offsets[0] + x) * GAME_GRID_SIZE
-            coord_y = global_offsets[1] + (offsets[1] + y) * GAME_GRID_SIZE
-            # Draw rectangle
-            if not outline_only:
-                pygame.draw.rect(screen,
-                                 TUtils.get_color_tuple(COLORS.get("TILE_" + TILES[val - 1])),
-                                 (coord_x, coord_y, GAME_GRID_SIZE, GAME_GRID_SIZE))
-                pygame.draw.rect(screen,
-                                 TUtils.get_color_tuple(COLORS.get("BACKGROUND_BLACK")),
-                                 (coord_x, coord_y, GAME_GRID_SIZE, GAME_GRID_SIZE), 1)
-                # Draw highlight triangle
-                offset = int(GAME_GRID_SIZE / 10)
-                pygame.draw.polygon(screen, TUtils.get_color_tuple(COLORS.get("TRIANGLE_GRAY")),
-                                    ((coord_x + offset, coord_y + offset),
-                                     (coord_x + 3 * offset, coord_y + offset),
-                                     (coord_x + offset, coord_y + 3 * offset)))
-            else:
-                # Outline-only for prediction location
-                pygame.draw.rect(screen,
-                                 TUtils.get_color_tuple(COLORS.get("TILE_" + TILES[val - 1])),
-                                 (coord_x + 1, coord_y + 1, GAME_GRID_SIZE - 2, GAME_GRID_SIZE - 2), 1)
+    screen.blits(ATLAS.get_tile_blits(matrix, offsets, global_offsets, outline_only), doreturn=False)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train genetic Tetris agents with a PyGame display")
+    parser.add_argument("--resume", action="store_true", help=f"resume the run from {CHECKPOINT_PATH}")
+    arguments = parser.parse_args()
     print(f"Hello world!")
     print(f">> Initializing {GAME_COUNT} Tetris games in parallel with a grid of {ROW_COUNT}×{COL_COUNT}...")
 
@@ -312,15 +445,31 @@ if __name__ == "__main__":
     pygame.init()
     pygame.font.init()
     display_screen = pygame.display.set_mode(size=(SCREEN_WIDTH, SCREEN_HEIGHT))
+    ATLAS = TRender.TileAtlas(GAME_GRID_SIZE, GAME_WIDTH, GAME_HEIGHT)
     print(f">> Screen size calculated to {SCREEN_WIDTH}×{SCREEN_HEIGHT}...")
 
     # Initialize Tetris modules and agents
-    print(f">> Initializing {GAME_COUNT} Tetris agent(s)...")
+    if arguments.resume and os.path.exists(CHECKPOINT_PATH):
+        POPULATION, gen_generation, gen_top_score, gen_score_history = TCheckpoint.restore_checkpoint(
+            TCheckpoint.load_checkpoint(CHECKPOINT_PATH), PopulationAgent)
+        assert len(POPULATION) == GAME_COUNT, f"Checkpoint has {len(POPULATION)} agents, expected {GAME_COUNT}"
+        gen_previous_best_score = gen_score_history[-1] if gen_score_history else 0.0
+        print(f">> Resumed {GAME_COUNT} Tetris agent(s) at generation #{gen_generation} from {CHECKPOINT_PATH}...")
+    else:
+        print(f">> Initializing {GAME_COUNT} Tetris agent(s)...")
+        POPULATION = Population(GAME_COUNT)
+    AGENTS = POPULATION.agents
+    tile_seed = random.getrandbits(32) if COMMON_TILE_SEQUENCE else None
     for _ in range(GAME_COUNT):
-        TETRIS_GAMES.append(Tetris())
-        AGENTS.append(GeneticAgent())
+        TETRIS_GAMES.append(Tetris(seed=tile_seed))
+
+    # Count and time the hot paths, including drawing on the display thread
+    if PROFILING:
+        TProfiler.enable()
+        draw = TProfiler.wrap(draw, "draw")
 
     print(f">> Initialization complete! Let the show begin!")
-    while True:
-        # Each loop iteration is 1 frame
-        update(display_screen)
+    gen_start_time = time.perf_counter()
+    LATEST_SNAPSHOT = get_snapshot()
+    threading.Thread(target=simulate, daemon=True).start()
+    render(display_screen)
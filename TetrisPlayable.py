@@ -3,11 +3,24 @@ import sys
 import random
 import pygame
 import threading
+from typing import NamedTuple
 from datetime import datetime
 import TetrisUtils as TUtils
 from TetrisSettings import *
 
 
+# Immutable copy of everything draw() shows, published by the thread updating the game
+class DisplaySnapshot(NamedTuple):
+    game: TUtils.GameSnapshot
+    lines: int
+    fitness: float
+    active: bool
+    paused: bool
+    next_tile: str
+    high_score: float
+    high_score_lines: int
+
+
 class TetrisGame:
     def __init__(self):
         # Scores
@@ -16,6 +29,8 @@ class TetrisGame:
         self.high_score = 0.0
         self.high_score_lines = 0
         self.fitness = 0.0
+        # Bumped on every published snapshot
+        self.version = 0
 
         # Initialize display stuff
         if HAS_DISPLAY:
@@ -72,6 +87,9 @@ class TetrisGame:
         self.lines = 0
         self.fitness = 0.0
 
+        # Display snapshot, the drawing thread never reads the game while it is being updated
+        self.publish()
+
     # Start the UI loop
     def start(self):
         self.active = True
@@ -109,9 +127,21 @@ class TetrisGame:
                 for key in self.key_actions:
                     if event.key == eval("pygame.K_" + key):
                         self.key_actions[key]()
+        self.publish()
+
+    # Called after every update, hands the new game state over to draw()
+    def publish(self):
+        self.version += 1
+        game = TUtils.GameSnapshot(tuple(map(tuple, self.board)), tuple(map(tuple, self.tile_shape)), self.tile_x,
+                                   self.tile_y, not self.active, self.score, self.version)
+        self.snapshot = DisplaySnapshot(game, self.lines, self.fitness, self.active, self.paused, self.get_next_tile(),
+                                        self.high_score, self.high_score_lines)
 
     # Called every tick after update
     def draw(self):
+        # Read the latest snapshot once, the game may be updated on another thread while drawing
+        snapshot = self.snapshot
+        game = snapshot.game
         # Background layer
         self.screen.fill(TUtils.get_color_tuple(COLORS.get("BACKGROUND_BLACK")))
 
@@ -126,14 +156,14 @@ class TetrisGame:
 
         # Tetris (tile) layer
         # Draw board first
-        self.draw_tiles(self.board)
+        self.draw_tiles(game.board)
         # Draw hypothesized tile
         if DISPLAY_PREDICTION:
-            self.draw_tiles(self.tile_shape, (
-                self.tile_x, TUtils.get_effective_height(self.board, self.tile_shape, (self.tile_x, self.tile_y))),
+            self.draw_tiles(game.tile_shape, (
+                game.tile_x, TUtils.get_effective_height(game.board, game.tile_shape, (game.tile_x, game.tile_y))),
                             True)
         # Draw current tile
-        self.draw_tiles(self.tile_shape, (self.tile_x, self.tile_y))
+        self.draw_tiles(game.tile_shape, (game.tile_x, game.tile_y))
 
         #################
         # Message Board #
@@ -145,9 +175,9 @@ class TetrisGame:
 
         # Title
         message = MESSAGES.get("TITLE")
-        if not self.active:
+        if not snapshot.active:
             message = "Game Over"
-        elif self.paused:
+        elif snapshot.paused:
             message = "= PAUSED ="
         text_image = pygame.font.SysFont(FONT_NAME, 32).render(message, False, TUtils.get_color_tuple(COLORS.get("WHITE")))
         self.screen.blit(text_image, (text_x_start, text_y_start))
@@ -161,34 +191,34 @@ class TetrisGame:
         text_y_start += 10
 
         # Score
-        text_image = pygame.font.SysFont(FONT_NAME, 16).render(MESSAGES.get("SCORE").format(self.score, self.lines), False, TUtils.get_color_tuple(COLORS.get("WHITE")))
+        text_image = pygame.font.SysFont(FONT_NAME, 16).render(MESSAGES.get("SCORE").format(game.score, snapshot.lines), False, TUtils.get_color_tuple(COLORS.get("WHITE")))
         self.screen.blit(text_image, (text_x_start, text_y_start))
         text_y_start += 20
 
         # High Score
-        high_score = self.score if self.score > self.high_score else self.high_score
-        high_score_lines = self.lines if self.lines > self.high_score_lines else self.high_score_lines
+        high_score = max(game.score, snapshot.high_score)
+        high_score_lines = max(snapshot.lines, snapshot.high_score_lines)
         text_image = pygame.font.SysFont(FONT_NAME, 16).render(MESSAGES.get("HIGH_SCORE").format(high_score, high_score_lines), False, TUtils.get_color_tuple(COLORS.get("WHITE")))
         self.screen.blit(text_image, (text_x_start, text_y_start))
         text_y_start += 20
 
         # Fitness score
-        text_image = pygame.font.SysFont(FONT_NAME, 16).render(MESSAGES.get("FITNESS").format(self.fitness), False, TUtils.get_color_tuple(COLORS.get("WHITE")))
+        text_image = pygame.font.SysFont(FONT_NAME, 16).render(MESSAGES.get("FITNESS").format(snapshot.fitness), False, TUtils.get_color_tuple(COLORS.get("WHITE")))
         self.screen.blit(text_image, (text_x_start, text_y_start))
         text_y_start += 20
 
         # Speed
-        speed = SPEED_DEFAULT if not SPEED_SCALE_ENABLED else int(max(50, SPEED_DEFAULT - self.score * SPEED_SCALE))
+        speed = SPEED_DEFAULT if not SPEED_SCALE_ENABLED else int(max(50, SPEED_DEFAULT - game.score * SPEED_SCALE))
         text_image = pygame.font.SysFont(FONT_NAME, 16).render(MESSAGES.get("SPEED").format(speed), False, TUtils.get_color_tuple(COLORS.get("WHITE")))
         self.screen.blit(text_image, (text_x_start, text_y_start))
         text_y_start += 20
 
         # Next tile
-        text_image = pygame.font.SysFont(FONT_NAME, 16).render(MESSAGES.get("NEXT_TILE").format(self.get_next_tile()), False, TUtils.get_color_tuple(COLORS.get("WHITE")))
+        text_image = pygame.font.SysFont(FONT_NAME, 16).render(MESSAGES.get("NEXT_TILE").format(snapshot.next_tile), False, TUtils.get_color_tuple(COLORS.get("WHITE")))
         self.screen.blit(text_image, (text_x_start, text_y_start))
         text_y_start += 20
 
-        self.draw_next_tile((text_x_start, text_y_start))
+        self.draw_next_tile((text_x_start, text_y_start), snapshot.next_tile)
         text_y_start += 60
 
         pygame.display.update()
@@ -221,9 +251,9 @@ class TetrisGame:
                                      TUtils.get_color_tuple(COLORS.get("TILE_" + TILES[val - 1])),
                                      (coord_x + 1, coord_y + 1, self.grid_size - 2, self.grid_size - 2), 1)
 
-    def draw_next_tile(self, offsets):
+    def draw_next_tile(self, offsets, tile):
         size = int(self.grid_size * 0.75)
-        for y, row in enumerate(TILE_SHAPES.get(self.get_next_tile())):
+        for y, row in enumerate(TILE_SHAPES.get(tile)):
             for x, val in enumerate(row):
                 if val == 0:
                     continue
@@ -446,6 +476,7 @@ class TetrisGame:
         if use_fitness:
             measurement = self.fitness - previous_fitness
         board = TUtils.get_board_with_tile(self.board, self.tile_shape, (self.tile_x, self.tile_y), True)
+        self.publish()
         return board, measurement, not self.active, self.get_next_tile()
 
     # Action = index of { NOTHING, L, R, 2L, 2R, ROTATE, SWAP, FAST_FALL, INSTANT_FALL }
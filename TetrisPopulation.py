@@ -0,0 +1,148 @@
+""" This file stores a population of genetic agents as one NumPy weight matrix, with vectorized breeding """
+
+# Imports
+import random
+import numpy as np
+from TetrisSettings import *
+from TetrisAgents import GeneticAgent, GeneticAgentComplete, BatchGeneticAgent, LookaheadAgent, ExpectimaxAgent
+
+# Weight attributes of GeneticAgentComplete, in the column order of the weight matrix
+WEIGHT_NAMES = ["weight_height", "weight_holes", "weight_bumpiness", "weight_line_clear"]
+# Fewest agents of a population, children are bred from 2 different parents out of the best half
+MIN_POPULATION_SIZE = 4
+
+
+def weight_property(column: int):
+    """ Attribute reading and writing column <COLUMN> of an agent's weight row """
+    def getter(agent):
+        return agent.weights[column]
+
+    def setter(agent, value):
+        agent.weights[column] = value
+        agent.weight_values = tuple(agent.weights.tolist())
+    return property(getter, setter)
+
+
+##################
+# Agents (Views) #
+##################
+class PopulationAgent(GeneticAgentComplete):
+    """ GeneticAgentComplete whose weights are a view on one row of a Population's weight matrix """
+
+    weight_height = weight_property(0)
+    weight_holes = weight_property(1)
+    weight_bumpiness = weight_property(2)
+    weight_line_clear = weight_property(3)
+
+    def __init__(self, weights=None):
+        """
+        :param weights: weight row (NumPy view) of this agent, None to create random weights of its own
+        """
+        # Skip GeneticAgentComplete's random weight attributes
+        GeneticAgent.__init__(self)
+        if weights is None:
+            weights = np.array([random.random() for _ in WEIGHT_NAMES])
+        self.weights = weights
+        # Weights as floats, read once per decision (NumPy scalars are slow in the placement loop)
+        self.weight_values = tuple(weights.tolist())
+
+    # Overrides parent's method, refreshes the weights before searching
+    def calculate_placement(self, board, current_tile, next_tile, offsets, board_hash=None):
+        self.weight_values = tuple(self.weights.tolist())
+        return super().calculate_placement(board, current_tile, next_tile, offsets, board_hash)
+
+    # Overrides parent's method, same operation order with the float weights
+    def get_features_fitness(self, features):
+        weight_height, weight_holes, weight_bumpiness, weight_line_clear = self.weight_values
+        aggregate_height, holes, bumpiness, clear_count, _ = features
+        score = 0
+        score += weight_line_clear * clear_count
+        score += weight_height * aggregate_height
+        score += weight_holes * holes
+        score += weight_bumpiness * bumpiness
+        return score
+
+
+class BatchPopulationAgent(PopulationAgent, BatchGeneticAgent):
+    """ BatchGeneticAgent whose weights are a view on one row of a Population's weight matrix """
+
+
+class LookaheadPopulationAgent(PopulationAgent, LookaheadAgent):
+    """ LookaheadAgent whose weights are a view on one row of a Population's weight matrix """
+
+
+class ExpectimaxPopulationAgent(PopulationAgent, ExpectimaxAgent):
+    """ ExpectimaxAgent whose weights are a view on one row of a Population's weight matrix """
+
+
+##############
+# Population #
+##############
+class Population:
+    """
+    Population of genetic agents stored as a (size × weights) NumPy matrix
+
+    Agents are views on the rows of the matrix and stay the same objects across generations, breeding rewrites the
+    matrix in place.
+    """
+
+    def __init__(self, size: int, agent_class=PopulationAgent, seed=None):
+        """
+        :param size: number of agents
+        :param agent_class: PopulationAgent (sub)class of the agents
+        :param seed: seed of the NumPy random generator used for breeding
+        """
+        assert size >= MIN_POPULATION_SIZE, \
+            f"A population needs at least {MIN_POPULATION_SIZE} agents (2 parents to breed from), got {size}"
+        self.rng = np.random.default_rng(seed)
+        # Initialize weights randomly, same range as GeneticAgentComplete
+        self.weights = self.rng.random((size, len(WEIGHT_NAMES)))
+        self.agents = [agent_class(self.weights[a]) for a in range(size)]
+
+    def __len__(self):
+        return len(self.agents)
+
+    def select(self, scores, count: int, rounds=None):
+        """
+        Indexes of the best <COUNT> agents, best first
+
+        Same ranking as TetrisAgents.next_generation(): by racing round, then by score, ties keep the agent order.
+
+        :param scores: score of each agent
+        :param count: number of agents to select
+        :param rounds: racing rounds reached by each agent (optional)
+        :return: NumPy array of agent indexes
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        rounds = np.zeros(len(scores)) if rounds is None else np.asarray(rounds)
+        # np.lexsort sorts by the last key first
+        return np.lexsort((np.arange(len(scores)), -scores, -rounds))[:count]
+
+    def next_generation(self, scores, mutation_rate: float = MUTATION_RATE, rounds=None):
+        """
+        Select the best half of the agents and breed them into the next generation, rewriting the weights in place
+
+        :param scores: score of each agent
+        :param mutation_rate: chance of each weight being mutated
+        :param rounds: racing rounds reached by each agent (optional), agents stopped earlier rank lower
+        :return: agents of the next generation, the best agent's weights are kept in the first row
+        """
+        size, weight_count = self.weights.shape
+        # Discard 50% of population
+        parents = self.select(scores, size // 2, rounds)
+        children = np.empty_like(self.weights)
+        # Keep first place agent
+        children[0] = self.weights[parents[0]]
+        # Breed the rest from 2 different random parents, choosing each weight randomly from either
+        first = self.rng.integers(0, len(parents), size - 1)
+        second = (first + self.rng.integers(1, len(parents), size - 1)) % len(parents)
+        from_first = self.rng.random((size - 1, weight_count)) < 0.5
+        children[1:] = np.where(from_first, self.weights[parents[first]], self.weights[parents[second]])
+        # Randomly mutate weights
+        mutated = self.rng.random((size - 1, weight_count)) < mutation_rate
+        children[1:][mutated] = self.rng.uniform(-1, 1, int(mutated.sum()))
+
+        self.weights[:] = children
+        for agent in self.agents:
+            agent.action_queue = []
+        return self.agents
@@ -0,0 +1,152 @@
+""" This file counts and times the hot paths of the game and agents, without any cost unless it is enabled """
+
+# Imports
+import functools
+from time import perf_counter
+import TetrisUtils as TUtils
+import TetrisBatch as TBatch
+import TetrisAgents as TAgents
+from Tetris import Tetris
+
+# Timers in report order: (name, label)
+TIMER_LABELS = [
+    ("collision", "Collision"),
+    ("evaluation", "Evaluation"),
+    ("batch", "Batch Eval"),
+    ("planning", "Planning"),
+    ("step", "Step"),
+    ("place", "Place"),
+    ("lock", "Lock"),
+    ("draw", "Draw"),
+]
+
+# Timer of each name, created by get_timer()
+TIMERS = {}
+# Whether the hot paths are instrumented (see enable)
+ENABLED = False
+
+
+class Timer:
+    """ Number of calls and total time (seconds) of the instrumented functions of one name """
+    __slots__ = ("calls", "seconds", "depth")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        # Calls in progress, nested calls (overridden methods calling super) are counted once
+        self.depth = 0
+
+
+def get_timer(name: str) -> Timer:
+    timer = TIMERS.get(name)
+    if timer is None:
+        timer = TIMERS[name] = Timer()
+    return timer
+
+
+def wrap(function, name: str, count=None):
+    """
+    Wrapper of <FUNCTION> counting and timing its calls under <NAME>
+
+    :param function: function to instrument
+    :param name: timer name
+    :param count: function of the call's arguments giving the amount counted per call (None to count 1 per call)
+    """
+    timer = get_timer(name)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if timer.depth:
+            return function(*args, **kwargs)
+        timer.depth += 1
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timer.seconds += perf_counter() - start
+            timer.calls += 1 if count is None else count(*args, **kwargs)
+            timer.depth -= 1
+    return wrapper
+
+
+def instrument(owner, attribute: str, name: str, count=None):
+    """ Replace the function <OWNER>.<ATTRIBUTE> (module or class attribute) by a counting and timing wrapper """
+    setattr(owner, attribute, wrap(getattr(owner, attribute), name, count))
+
+
+def count_batch_placements(board, tiles, *args, **kwargs):
+    """ Number of placements evaluated by one TBatch.get_best_placement() call """
+    return len(TBatch.get_candidate_table(tiles)["x"])
+
+
+def enable():
+    """
+    Instrument the hot paths: collision checks, placement evaluation, agent planning, game steps and tile locks
+
+    Nothing is wrapped until this is called, so profiling costs nothing when it is off. Call it before starting
+    worker processes so they are instrumented too.
+    """
+    global ENABLED
+    if ENABLED:
+        return
+    ENABLED = True
+    # TetrisUtils: every caller goes through the module attribute
+    instrument(TUtils, "check_collision", "collision")
+    instrument(TBatch, "get_best_placement", "batch", count_batch_placements)
+    # Tetris: game steps, placements and locked tiles (one per placement)
+    instrument(Tetris, "step", "step")
+    instrument(Tetris, "place", "place")
+    instrument(Tetris, "on_tile_collision", "lock")
+    # TetrisAgents: every agent class overriding the planning and evaluation methods
+    for agent_class in vars(TAgents).values():
+        if not isinstance(agent_class, type) or not issubclass(agent_class, TAgents.BaseAgent):
+            continue
+        if "calculate_placement" in vars(agent_class):
+            instrument(agent_class, "calculate_placement", "planning")
+        if "evaluate_placement" in vars(agent_class):
+            instrument(agent_class, "evaluate_placement", "evaluation")
+
+
+def pop_stats():
+    """ {name: (calls, seconds)} of every timer since the last call, and reset the timers """
+    stats = {}
+    for name, timer in TIMERS.items():
+        stats[name] = (timer.calls, timer.seconds)
+        timer.calls, timer.seconds = 0, 0.0
+    return stats
+
+
+def merge_stats(all_stats):
+    """ Sum the stats (see pop_stats) of several processes """
+    merged = {}
+    for stats in all_stats:
+        for name, (calls, seconds) in stats.items():
+            total_calls, total_seconds = merged.get(name, (0, 0.0))
+            merged[name] = (total_calls + calls, total_seconds + seconds)
+    return merged
+
+
+def get_rates(stats, elapsed: float):
+    """ (placements per second, evaluations per second) over <ELAPSED> seconds, batch evaluations included """
+    elapsed = max(elapsed, 1e-9)
+    evaluations = stats.get("evaluation", (0, 0))[0] + stats.get("batch", (0, 0))[0]
+    return stats.get("lock", (0, 0))[0] / elapsed, evaluations / elapsed
+
+
+def get_timer_rows(stats, elapsed: float):
+    """
+    Timers that were called, in report order
+
+    Timers include the time of the timers called inside them (e.g. collision checks during a step), so the shares
+    can add up to more than 100%.
+
+    :param stats: see pop_stats()
+    :param elapsed: wall time (seconds) the stats were collected over
+    :return: list of (label, calls, seconds, share of <ELAPSED>); batch evaluations count placements, not calls
+    """
+    rows = []
+    for name, label in TIMER_LABELS:
+        calls, seconds = stats.get(name, (0, 0.0))
+        if calls > 0:
+            rows.append((label, calls, seconds, seconds / max(elapsed, 1e-9)))
+    return rows
@@ -0,0 +1,133 @@
+""" This file provides a racing (successive halving) scheduler that stops hopeless games early in a generation """
+
+# Imports
+import random
+from TetrisSettings import *
+
+
+class RacingScheduler:
+    """
+    Runs the games of one generation, stopping the worst games at score checkpoints
+
+    At each checkpoint frame, the games outside the best (1 - <DROP_FRACTION>) are stopped, but never below <MIN_KEEP>
+    games: by default the number of agents selected as parents (half the games) plus RACING_KEEP_MARGIN, so parents are
+    picked among the finalists on their full-game scores. Agents are ranked by (racing round, score), so this is not
+    the ranking of playing every game to the end: a stopped agent that would have caught up after the checkpoint
+    ranks below every finalist. The margin lets the agents just below the parent cut at a checkpoint keep playing.
+
+    With <EXTRA_EPISODES>, the frames saved are spent on extra episodes of the best finalists (with a fresh tile
+    sequence), whose score becomes the mean over their episodes. This trades the time saved for a less noisy ranking of
+    the finalists: a generation then costs as many frames as without racing, and finalists are compared on different
+    numbers of episodes and tile sequences. Without it, every agent is ranked on the same single episode.
+
+    Call update() once per frame before stepping the games, and only step the games that are still running.
+    """
+
+    def __init__(self, game_count: int, time_limit: int = 1000, checkpoints=RACING_CHECKPOINTS,
+                 drop_fraction: float = RACING_DROP_FRACTION, extra_episodes: bool = RACING_EXTRA_EPISODES,
+                 min_keep: int = -1):
+        self.game_count = game_count
+        self.time_limit = time_limit
+        # Racing needs a time limit to know the frames saved
+        self.checkpoints = set(checkpoints) if time_limit != -1 else set()
+        self.drop_fraction = drop_fraction
+        self.extra_episodes = extra_episodes and time_limit != -1
+        # Fewest games kept running at a checkpoint (-1: the parents selected plus RACING_KEEP_MARGIN)
+        self.min_keep = min(game_count, game_count // 2 + RACING_KEEP_MARGIN) if min_keep == -1 else min_keep
+
+        ##############
+        # Race State #
+        ##############
+        # Whether each game is still being played
+        self.active = []
+        # Number of checkpoints passed by each game, agents stopped earlier rank lower
+        self.rounds = []
+        # Score of each episode played by each game
+        self.episode_scores = []
+        self.episode = 0
+        self.tile_seed = None
+        # Whether each game was stopped before it was over
+        self.stopped = []
+        # Frames of the current episode, total frames of the generation and game frames saved by stopping games
+        self.frame = 0
+        self.total_frames = 0
+        self.saved_frames = 0
+        self.reset()
+
+    def reset(self, tile_seed=None):
+        """
+        Start a new generation (the games must be reset by the caller)
+
+        :param tile_seed: tile seed of the extra episodes, None to draw one when needed
+        """
+        self.active = [True] * self.game_count
+        self.rounds = [0] * self.game_count
+        self.episode_scores = [[] for _ in range(self.game_count)]
+        self.episode = 0
+        self.tile_seed = tile_seed
+        self.stopped = [False] * self.game_count
+        self.frame = 0
+        self.total_frames = 0
+        self.saved_frames = 0
+
+    def is_running(self, games, index: int) -> bool:
+        """ Whether game #<INDEX> should be stepped """
+        return self.active[index] and not games[index].game_over
+
+    def update(self, games, agents) -> bool:
+        """
+        Advance the race by 1 frame: stop games at checkpoints and start extra episodes
+
+        :param games: Tetris instance of each agent
+        :param agents: agent of each game
+        :return: whether the generation is over
+        """
+        self.frame += 1
+        self.total_frames += 1
+        running = [a for a in range(self.game_count) if self.is_running(games, a)]
+        if not running or (self.time_limit != -1 and self.frame % self.time_limit == 0):
+            return self.end_episode(games, agents)
+        if self.episode == 0 and self.frame in self.checkpoints:
+            self.stop_games(games)
+        return False
+
+    def stop_games(self, games):
+        """ Stop the games outside the best ones at a checkpoint """
+        racers = [a for a in range(self.game_count) if self.active[a]]
+        keep = max(self.min_keep, int(len(racers) * (1 - self.drop_fraction) + 0.5))
+        # Finished games keep competing with their final score
+        racers.sort(key=lambda a: games[a].score, reverse=True)
+        for a in racers[:keep]:
+            self.rounds[a] += 1
+        for a in racers[keep:]:
+            self.active[a] = False
+            self.episode_scores[a].append(games[a].score)
+            if not games[a].game_over:
+                self.saved_frames += self.time_limit - self.frame
+                self.stopped[a] = True
+
+    def end_episode(self, games, agents) -> bool:
+        """ Record the scores of the episode, then start the extra episode if enough frames were saved """
+        finalists = [a for a in range(self.game_count) if self.active[a]]
+        for a in finalists:
+            self.episode_scores[a].append(games[a].score)
+        if self.episode > 0 or not self.extra_episodes:
+            return True
+        # Best finalists play again with the saved frames, all on the same fresh tile sequence
+        finalists.sort(key=lambda a: games[a].score, reverse=True)
+        finalists = finalists[:self.saved_frames // self.time_limit]
+        if not finalists:
+            return True
+        tile_seed = random.getrandbits(32) if self.tile_seed is None else self.tile_seed
+        self.active = [False] * self.game_count
+        for a in finalists:
+            self.active[a] = True
+            games[a].reset_game(tile_seed)
+            agents[a].action_queue = []
+        self.episode += 1
+        self.frame = 0
+        return False
+
+    def get_scores(self):
+        """ Score of each game, the mean over its episodes """
+        return [sum(scores) / len(scores) for scores in self.episode_scores]
@@ -0,0 +1,202 @@
+""" This file records games as GIFs (or PNG sequences) in a separate process, without PyGame or a display """
+
+# Imports
+import os
+import zlib
+import struct
+import multiprocessing
+import numpy as np
+import TetrisUtils as TUtils
+from TetrisSettings import *
+
+# Pillow is optional, frames are saved as PNG sequences without it
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Frame header: current tile (index in TILES), rotation, x, y, game over; the board cells (1 byte each) follow
+FRAME_HEADER = struct.Struct("<BBBB?")
+
+# Palette of the recorded images, tile value v is drawn with PALETTE_NAMES[v + 3]
+PALETTE_NAMES = ["BACKGROUND_DARK", "BACKGROUND_LIGHT", "BACKGROUND_BLACK", "TRIANGLE_GRAY"] + \
+                ["TILE_" + tile for tile in TILES]
+PALETTE = bytes(channel for name in PALETTE_NAMES for channel in TUtils.get_color_tuple(COLORS.get(name)))
+
+# Queue of the recorder process, set in every process sending frames (see set_queue)
+FRAME_QUEUE = None
+
+
+#################
+# Frame Sending #
+#################
+def set_queue(queue):
+    """ Send the frames of this process to <QUEUE> (also used as a process pool initializer) """
+    global FRAME_QUEUE
+    FRAME_QUEUE = queue
+
+
+def encode_frame(tetris) -> bytes:
+    """ Compact state of a game: header (see FRAME_HEADER) and board cells, ~200 bytes """
+    header = FRAME_HEADER.pack(TILES.index(tetris.current_tile), tetris.tile_rotation, tetris.tile_x, tetris.tile_y,
+                               tetris.game_over)
+    return header + b"".join(map(bytes, tetris.board))
+
+
+def start_clip(name: str):
+    """ Start a new clip, saved as <NAME>.gif (or <NAME>/frame_#####.png) """
+    FRAME_QUEUE.put(("start", name))
+
+
+def add_frame(tetris):
+    """ Add the current state of a game to the clip """
+    FRAME_QUEUE.put(encode_frame(tetris))
+
+
+def end_clip():
+    """ End the clip, the recorder process saves it in the background """
+    FRAME_QUEUE.put(("end", None))
+
+
+#################
+# Rasterization #
+#################
+def get_tile_template(grid_size: int):
+    """ Part of a tile block drawn by each pixel: 0 = fill, 1 = black border, 2 = highlight triangle """
+    template = np.zeros((grid_size, grid_size), dtype=np.uint8)
+    offset = int(grid_size / 10)
+    py, px = np.mgrid[0:grid_size, 0:grid_size]
+    template[(px >= offset) & (py >= offset) & (px + py <= 4 * offset)] = 2
+    template[[0, -1], :] = 1
+    template[:, [0, -1]] = 1
+    return template
+
+
+class Rasterizer:
+    """ Turns encoded frames into palette images (2D arrays of PALETTE indexes) with NumPy """
+
+    def __init__(self, grid_size: int):
+        self.grid_size = grid_size
+        # Board cell and tile block part of each pixel
+        self.cell_rows = np.arange(GRID_ROW_COUNT * grid_size) // grid_size
+        self.cell_cols = np.arange(GRID_COL_COUNT * grid_size) // grid_size
+        self.template = np.tile(get_tile_template(grid_size), (GRID_ROW_COUNT, GRID_COL_COUNT))
+        # Palette index of each (tile value, block part), empty cells are striped like TetrisParallel
+        self.colors = np.array([[0, 0, 0]] + [[v + 3, 2, 3] for v in range(1, len(TILES) + 1)], dtype=np.uint8)
+        self.light_columns = (self.cell_cols % 2 == 1)[np.newaxis, :]
+
+    def get_cells(self, frame: bytes):
+        """ Board cells of an encoded frame, with the current tile added """
+        tile, rotation, tile_x, tile_y, game_over = FRAME_HEADER.unpack_from(frame)
+        cells = np.frombuffer(frame, dtype=np.uint8, offset=FRAME_HEADER.size)
+        cells = cells.reshape(GRID_ROW_COUNT, GRID_COL_COUNT).copy()
+        if not game_over:
+            shape = np.array(TUtils.TILE_ORIENTATIONS[TILES[tile]][rotation].shape, dtype=np.uint8)
+            # Clip the tile to the board, it can stick out while locking
+            height = min(len(shape), GRID_ROW_COUNT - tile_y)
+            region = cells[tile_y:tile_y + height, tile_x:tile_x + len(shape[0])]
+            np.copyto(region, shape[:height], where=shape[:height] != 0)
+        return cells
+
+    def rasterize(self, frame: bytes):
+        """ Palette image of an encoded frame """
+        cells = self.get_cells(frame)
+        pixel_cells = cells[self.cell_rows[:, np.newaxis], self.cell_cols[np.newaxis, :]]
+        pixels = self.colors[pixel_cells, self.template]
+        pixels[(pixel_cells == 0) & self.light_columns] = 1
+        return pixels
+
+
+############
+# Encoding #
+############
+def get_png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def write_png(path: str, pixels):
+    """ Write a palette image as a PNG file (zlib only, no Pillow needed) """
+    height, width = pixels.shape
+    # Each row starts with its filter type (0 = none)
+    rows = np.concatenate([np.zeros((height, 1), dtype=np.uint8), pixels], axis=1)
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(get_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)))
+        file.write(get_png_chunk(b"PLTE", PALETTE))
+        file.write(get_png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+        file.write(get_png_chunk(b"IEND", b""))
+
+
+def save_clip(path: str, name: str, frames, rasterizer: Rasterizer, image_format: str, fps: int):
+    """
+    Rasterize and save the frames of a clip
+
+    :param path: output directory
+    :param name: clip name
+    :param frames: encoded frames
+    :param rasterizer: Rasterizer of the output grid size
+    :param image_format: "gif" (needs Pillow) or "png" (one file per frame)
+    :param fps: frames per second of the GIF
+    """
+    if not frames:
+        return
+    images = [rasterizer.rasterize(frame) for frame in frames]
+    if image_format == "gif":
+        palette_images = []
+        for pixels in images:
+            image = Image.fromarray(pixels, "P")
+            image.putpalette(PALETTE)
+            palette_images.append(image)
+        palette_images[0].save(os.path.join(path, name + ".gif"), save_all=True, append_images=palette_images[1:],
+                               duration=int(1000 / fps), loop=0)
+        return
+    clip_path = os.path.join(path, name)
+    os.makedirs(clip_path, exist_ok=True)
+    for index, pixels in enumerate(images):
+        write_png(os.path.join(clip_path, f"frame_{index:05d}.png"), pixels)
+
+
+def run_recorder(queue, path: str, image_format: str, grid_size: int, fps: int):
+    """ Recorder process: collects the frames of each clip and saves the clip once it ends """
+    os.makedirs(path, exist_ok=True)
+    rasterizer = Rasterizer(grid_size)
+    name, frames = None, []
+    while True:
+        message = queue.get()
+        if isinstance(message, bytes):
+            frames.append(message)
+            continue
+        # A new clip, an ended clip or a stop request (None) saves the current clip
+        if name is not None:
+            save_clip(path, name, frames, rasterizer, image_format, fps)
+        name, frames = None, []
+        if message is None:
+            return
+        if message[0] == "start":
+            name = message[1]
+
+
+class Recorder:
+    """ Starts the recorder process, and sends the frames of this process to it """
+
+    def __init__(self, path: str = RECORDER_PATH, image_format: str = RECORDER_FORMAT,
+                 grid_size: int = RECORDER_GRID_SIZE, fps: int = RECORDER_FPS):
+        """
+        :param path: output directory
+        :param image_format: "gif" or "png", GIFs fall back to PNG sequences if Pillow is not installed
+        :param grid_size: size of a board cell in pixels
+        :param fps: frames per second of the GIFs
+        """
+        if image_format == "gif" and Image is None:
+            print(">> Pillow is not installed, recording PNG sequences instead of GIFs")
+            image_format = "png"
+        self.queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=run_recorder, daemon=True,
+                                               args=(self.queue, path, image_format, grid_size, fps))
+        self.process.start()
+        set_queue(self.queue)
+
+    def close(self):
+        """ Save the last clip and stop the recorder process """
+        self.queue.put(None)
+        self.process.join()
@@ -0,0 +1,106 @@
+""" This file caches PyGame surfaces (tiles, fonts, text) so Tetris boards are drawn with a few blits per frame """
+
+# Imports
+import pygame
+import TetrisUtils as TUtils
+from TetrisSettings import *
+
+# Maximum number of cached text surfaces (changing text such as scores would otherwise grow the cache forever)
+TEXT_CACHE_SIZE = 512
+
+# Cached color tuples, fonts and text surfaces
+COLOR_TUPLES = {name: TUtils.get_color_tuple(color_hex) for name, color_hex in COLORS.items()}
+FONTS = {}
+TEXTS = {}
+
+
+def get_color(name: str):
+    """ Color tuple of a color in COLORS """
+    return COLOR_TUPLES.get(name) or TUtils.get_color_tuple(None)
+
+
+def get_font(font_size: int):
+    """ Cached font of FONT_NAME in the given size """
+    font = FONTS.get(font_size)
+    if font is None:
+        font = FONTS[font_size] = pygame.font.SysFont(FONT_NAME, font_size)
+    return font
+
+
+def get_text(message: str, font_size: int = 16, color: str = "WHITE"):
+    """ Cached surface of a line of text """
+    key = (message, font_size, color)
+    text_image = TEXTS.get(key)
+    if text_image is None:
+        if len(TEXTS) >= TEXT_CACHE_SIZE:
+            TEXTS.clear()
+        text_image = TEXTS[key] = get_font(font_size).render(message, False, get_color(color))
+    return text_image
+
+
+class TileAtlas:
+    """ Pre-rendered surfaces of every tile type (and the board background) for one grid size """
+
+    def __init__(self, grid_size: float, board_width: int, board_height: int):
+        self.grid_size = grid_size
+        size = int(grid_size)
+        # Index = tile value (1-7), index 0 is unused
+        self.tiles = [None] + [self.render_tile(size, "TILE_" + tile) for tile in TILES]
+        self.outlines = [None] + [self.render_outline(size, "TILE_" + tile) for tile in TILES]
+        self.background = self.render_background(grid_size, board_width, board_height)
+        self.game_over = self.render_game_over(board_width, board_height)
+
+    @staticmethod
+    def render_tile(size: int, color: str):
+        """ Tile block: filled square, black border and highlight triangle """
+        surface = pygame.Surface((size, size))
+        surface.fill(get_color(color))
+        pygame.draw.rect(surface, get_color("BACKGROUND_BLACK"), (0, 0, size, size), 1)
+        offset = int(size / 10)
+        pygame.draw.polygon(surface, get_color("TRIANGLE_GRAY"),
+                            ((offset, offset), (3 * offset, offset), (offset, 3 * offset)))
+        return surface
+
+    @staticmethod
+    def render_outline(size: int, color: str):
+        """ Outline-only tile block, for prediction locations """
+        surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.rect(surface, get_color(color), (1, 1, size - 2, size - 2), 1)
+        return surface
+
+    @staticmethod
+    def render_background(grid_size: float, board_width: int, board_height: int):
+        """ Striped board background """
+        surface = pygame.Surface((board_width, board_height))
+        for a in range(GRID_COL_COUNT):
+            color = get_color("BACKGROUND_DARK" if a % 2 == 0 else "BACKGROUND_LIGHT")
+            pygame.draw.rect(surface, color, (a * grid_size, 0, grid_size, board_height))
+        return surface
+
+    @staticmethod
+    def render_game_over(board_width: int, board_height: int):
+        """ Game over banner, drawn over the board """
+        surface = pygame.Surface((board_width, board_height), pygame.SRCALPHA)
+        ratio = 0.9
+        pygame.draw.rect(surface, get_color("BACKGROUND_BLACK"),
+                         (0, (board_height * ratio) / 2, board_width, board_height * (1 - ratio)))
+        text_image = get_font(board_width // 6).render("GAME OVER", False, get_color("RED"))
+        rect = text_image.get_rect()
+        surface.blit(text_image, ((board_width - rect.width) / 2, (board_height - rect.height) / 2))
+        return surface
+
+    def get_tile_blits(self, matrix, offsets=(0, 0), global_offsets=(0, 0), outline_only=False):
+        """
+        (surface, position) pairs drawing the tiles of a matrix, for Surface.blits()
+
+        :param matrix: the matrix to draw (2D list, tuple or BitBoard)
+        :param offsets: matrix index offsets
+        :param global_offsets: global pixel offsets
+        :param outline_only: draw prediction outline only?
+        """
+        surfaces = self.outlines if outline_only else self.tiles
+        grid_size = self.grid_size
+        base_x = global_offsets[0] + offsets[0] * grid_size
+        base_y = global_offsets[1] + offsets[1] * grid_size
+        return [(surfaces[val], (int(base_x + x * grid_size), int(base_y + y * grid_size)))
+                for y, row in enumerate(matrix) for x, val in enumerate(row) if val != 0]
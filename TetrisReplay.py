@@ -0,0 +1,77 @@
+""" This file stores game replays compactly and re-simulates them headlessly to verify their scores and boards """
+
+# Imports
+import sys
+import time
+import struct
+from Tetris import Tetris
+import TetrisUtils as TUtils
+from TetrisSettings import *
+
+# Replay header: tile seed, final score, final board hash, number of placements (1 byte each follows)
+REPLAY_HEADER = struct.Struct("<IdQI")
+
+
+###############
+# Replay File #
+###############
+def pack_replay(replay: TUtils.GameReplay) -> bytes:
+    """ Pack a replay into a header and its placement bytes """
+    return REPLAY_HEADER.pack(replay.seed, replay.score, replay.board_hash, len(replay.placements)) + replay.placements
+
+
+def write_replays(path: str, replays, append=True):
+    """
+    Write replays into a replay file
+
+    :param path: replay file
+    :param replays: replays to write
+    :param append: whether to add the replays after the existing ones
+    """
+    with open(path, "ab" if append else "wb") as file:
+        file.write(b"".join(pack_replay(replay) for replay in replays))
+
+
+def read_replays(path: str):
+    """ Read every replay of a replay file """
+    with open(path, "rb") as file:
+        data = file.read()
+    replays = []
+    offset = 0
+    while offset < len(data):
+        seed, score, board_hash, count = REPLAY_HEADER.unpack_from(data, offset)
+        offset += REPLAY_HEADER.size
+        replays.append(TUtils.GameReplay(seed, data[offset:offset + count], score, board_hash))
+        offset += count
+    return replays
+
+
+#################
+# Re-simulation #
+#################
+def replay_game(replay: TUtils.GameReplay, bitboard: bool = USE_BITBOARD) -> Tetris:
+    """ Re-simulate a replay placement by placement, returns the resulting game """
+    tetris = Tetris(bitboard, seed=replay.seed)
+    for value in replay.placements:
+        tetris.play_placement(*TUtils.unpack_placement(value))
+    return tetris
+
+
+def verify_replay(replay: TUtils.GameReplay, bitboard: bool = USE_BITBOARD) -> bool:
+    """ Whether re-simulating the replay gives the recorded final score and board """
+    tetris = replay_game(replay, bitboard)
+    return tetris.score == replay.score and tetris.board_hash == replay.board_hash
+
+
+if __name__ == "__main__":
+    # Verify every replay of the given replay files: py TetrisReplay.py replays.bin
+    for replay_path in sys.argv[1:]:
+        start_time = time.perf_counter()
+        all_replays = read_replays(replay_path)
+        failed = [index for index, game in enumerate(all_replays) if not verify_replay(game, bitboard=True)]
+        elapsed = time.perf_counter() - start_time
+        placement_count = sum(len(game.placements) for game in all_replays)
+        print(f">> {replay_path}: {len(all_replays) - len(failed)}/{len(all_replays)} replay(s) verified, "
+              f"{placement_count} placements in {elapsed:.2f}s ({len(all_replays) / max(elapsed, 1e-9):.0f} games/s)")
+        if failed:
+            print(f">> Failed replays: {SEP.join(map(str, failed))}")
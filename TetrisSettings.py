@@ -66,6 +66,66 @@ WEIGHT_HOLES = -0.75
 WEIGHT_BUMPINESS = -0.18
 WEIGHT_LINE_CLEARED = 1.3
 
+##########################
+# Genetics Configuration #
+##########################
+MUTATION_RATE = 0.1  # 10% mutation chance
+# Give every game of a generation the same tile sequence (less luck when ranking agents)
+COMMON_TILE_SEQUENCE = True
+# Racing: stop the worst half of the running games at these frames of a generation (empty to disable)
+RACING_CHECKPOINTS = [250]
+RACING_DROP_FRACTION = 0.5
+# Racing: games kept beyond the parents selected (half the games), parents are then picked on full-game scores. Agents
+# are ranked by (racing round, score): a stopped agent ranks below every finalist, even if it would have caught up
+RACING_KEEP_MARGIN = 2
+# Spend the frames saved by racing on an extra episode of the best agents. Off by default: it spends the saved time
+# again, and finalists are then ranked on the mean of 2 episodes (one on a different tile sequence) instead of 1
+RACING_EXTRA_EPISODES = False
+# Lookahead agent: number of best first placements searched for a follow-up placement
+LOOKAHEAD_BEAM_WIDTH = 5
+# Expectimax agent: deepest search (in tiles), best placements searched further per tile
+EXPECTIMAX_MAX_DEPTH = 3
+EXPECTIMAX_BEAM_WIDTH = 3
+# Expectimax agent: search time per move in seconds, -1 for no limit
+# A budget makes the chosen moves depend on the machine's speed, so seeded runs, checkpoints and replays are no longer
+# reproducible; only set one where frames must not stall
+EXPECTIMAX_TIME_BUDGET = -1
+# Island model: elites sent to the neighbouring islands every N generations, "ring" or "full" topology
+ISLAND_MIGRATION_INTERVAL = 5
+ISLAND_MIGRANT_COUNT = 2
+ISLAND_TOPOLOGY = "ring"
+
+#######################
+# Board Configuration #
+#######################
+# Store Tetris boards as one integer bitmask per row (faster collision checks)
+USE_BITBOARD = False
+# Number of 7-tile bags generated at a time by each tile stream
+TILE_STREAM_BAG_COUNT = 64
+
+############################
+# Checkpoint Configuration #
+############################
+# Training runs are saved to this file every N generations (0 to disable), and resumed with --resume
+CHECKPOINT_PATH = "checkpoint.npz"
+CHECKPOINT_INTERVAL = 10
+
+##########################
+# Recorder Configuration #
+##########################
+# Recorded games (see TetrisRecorder) are saved in this directory as "gif" (needs Pillow) or "png" sequences
+RECORDER_PATH = "recordings"
+RECORDER_FORMAT = "gif"
+# Size of a board cell in pixels, and GIF frame rate
+RECORDER_GRID_SIZE = 10
+RECORDER_FPS = 30
+
+###########################
+# Profiling Configuration #
+###########################
+# Count and time the hot paths (see TetrisProfiler) and report them every generation, costs nothing when off
+PROFILING = False
+
 ######################
 # STEP Configuration #
 ######################
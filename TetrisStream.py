@@ -0,0 +1,62 @@
+""" This file provides seeded 7-bag tile streams, so games can be replayed or share the same tile sequence """
+
+# Imports
+import random
+from TetrisSettings import *
+
+
+class TileStream:
+    """
+    Stream of tiles made of shuffled bags of all 7 tiles, generated <BAG_COUNT> bags at a time
+
+    Tiles are read with a cursor instead of popping the front of a list. Two streams with the same seed yield the same
+    tiles, a stream without a seed uses the global random state.
+    """
+
+    def __init__(self, seed=None, bag_count: int = TILE_STREAM_BAG_COUNT):
+        self.bag_count = bag_count
+        self.seed = seed
+        self.rng = random
+        self.tiles = []
+        self.cursor = 0
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """ Restart the stream from <SEED> (or from the global random state if None) """
+        self.seed = seed
+        self.rng = random if seed is None else random.Random(seed)
+        self.tiles = []
+        self.cursor = 0
+
+    def generate(self):
+        """ Replace the consumed tiles with the next <BAG_COUNT> bags """
+        tiles = []
+        bag = list(TILE_SHAPES.keys())
+        for _ in range(self.bag_count):
+            self.rng.shuffle(bag)
+            tiles += bag
+        self.tiles = tiles
+        self.cursor = 0
+
+    def peek(self):
+        """ Next tile without consuming it """
+        if self.cursor == len(self.tiles):
+            self.generate()
+        return self.tiles[self.cursor]
+
+    def pop(self):
+        """ Consume the next tile """
+        tile = self.peek()
+        self.cursor += 1
+        return tile
+
+    def get_bag_remaining(self):
+        """ Tiles left in the current bag after the next tile (empty if the next tile is the last one of its bag) """
+        self.peek()
+        bag_end = (self.cursor // len(TILE_SHAPES) + 1) * len(TILE_SHAPES)
+        return self.tiles[self.cursor + 1:bag_end]
+
+    def replace(self, tile):
+        """ Replace the next tile, used when the current tile is swapped with it """
+        self.peek()
+        self.tiles[self.cursor] = tile
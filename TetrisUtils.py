@@ -1,12 +1,16 @@
 import random
-from copy import deepcopy
+from typing import *
 from TetrisSettings import *
+import TetrisZobrist as TZobrist
+from TetrisBitboard import BitBoard, get_shape_key, get_tile_masks
 
 
 ###########################
 # Board Helper Algorithms #
 ###########################
 def check_collision(board, tile_shape, offsets):
+    if isinstance(board, BitBoard):
+        return board.check_collision(tile_shape, offsets)
     for cy, row in enumerate(tile_shape):
         for cx, val in enumerate(row):
             if val == 0:
@@ -19,29 +23,151 @@ def check_collision(board, tile_shape, offsets):
     return False
 
 
-def get_effective_height(board, tile, offsets):
+def get_effective_height(board, tile, offsets, heights=None):
     offset_x, offset_y = offsets
+    # Use the column heights (if known) to skip the row-by-row search
+    if heights is not None:
+        landing_y = get_landing_height(heights, get_tile_orientations(tile)[0].bottom, offsets)
+        if landing_y is not None:
+            return landing_y
     while not check_collision(board, tile, (offset_x, offset_y)):
         offset_y += 1
     return offset_y - 1
 
 
+def get_landing_height(heights, bottom, offsets):
+    """
+    Find the row the tile lands on from the column heights in O(tile width)
+
+    :param heights: height of each column of the board
+    :param bottom: bottom profile of the tile (see TileOrientation)
+    :param offsets: x, y offsets of the tile
+    :return: landing y offset, or None if the tile is below a column's top (it could be under an overhang)
+    """
+    offset_x, offset_y = offsets
+    landing_y = min(GRID_ROW_COUNT - heights[offset_x + x] - bottom[x] for x in range(len(bottom))) - 1
+    return landing_y if landing_y >= offset_y else None
+
+
 def get_board_with_tile(board, tile, offsets, flattened=False):
     # Make a copy
-    board = deepcopy(board)
-    # If flatten, change all numbers to 0/1
-    if flattened:
-        board = [[int(bool(val)) for val in row] for row in board]
+    if isinstance(board, BitBoard):
+        board = board.flattened() if flattened else board.copy()
+    else:
+        # If flatten, change all numbers to 0/1
+        if flattened:
+            board = [[int(bool(val)) for val in row] for row in board]
+        else:
+            # Rows hold ints only, slicing them is a full copy (and much cheaper than deepcopy)
+            board = [row[:] for row in board]
     # Add current tile (do not flatten)
+    add_tile_to_board(board, tile, offsets)
+    return board
+
+
+# Lock a tile onto the board
+# WARNING: MODIFIES BOARD!!!
+def add_tile_to_board(board, tile, offsets):
+    if isinstance(board, BitBoard):
+        board.add_tile(tile, offsets)
+        return
     for y, row in enumerate(tile):
         for x, val in enumerate(row):
             if val != 0:
-                board[y + offsets[1]][x + offsets[0]] = val
-    return board
+                board[y + offsets[1]][min(x + offsets[0], GRID_COL_COUNT - 1)] = val
 
 
-def get_future_board_with_tile(board, tile, offsets, flattened=False):
-    return get_board_with_tile(board, tile, (offsets[0], get_effective_height(board, tile, offsets)), flattened)
+def get_future_board_with_tile(board, tile, offsets, flattened=False, heights=None):
+    return get_board_with_tile(board, tile, (offsets[0], get_effective_height(board, tile, offsets, heights)), flattened)
+
+
+# Lock a tile onto the board and update the board's Zobrist hash
+# WARNING: MODIFIES BOARD!!!
+def add_tile_with_hash(board, tile, offsets, board_hash):
+    if isinstance(board, BitBoard):
+        board.add_tile(tile, offsets)
+        return board.hash
+    rows = range(offsets[1], offsets[1] + len(tile))
+    for y in rows:
+        board_hash ^= TZobrist.ROW_KEYS[y][TZobrist.get_row_mask(board[y])]
+    add_tile_to_board(board, tile, offsets)
+    for y in rows:
+        board_hash ^= TZobrist.ROW_KEYS[y][TZobrist.get_row_mask(board[y])]
+    return board_hash
+
+
+def get_future_board_and_hash(board, tile, offsets, board_hash=None, heights=None):
+    """
+    Copy of the board with the tile dropped and completed rows cleared, with its Zobrist hash updated incrementally
+
+    :param board: the board to drop the tile on (not modified)
+    :param tile: the tile shape to drop
+    :param offsets: x, y offsets of the tile before dropping
+    :param board_hash: hash of the board, None to skip hashing
+    :param heights: column heights of the board (optional, speeds up the drop)
+    :return: (resulting board, number of rows cleared, hash of the resulting board or None)
+    """
+    landing = (offsets[0], get_effective_height(board, tile, offsets, heights))
+    if board_hash is None:
+        return get_board_and_lines_cleared(get_board_with_tile(board, tile, landing)) + (None,)
+    future_board = board.copy() if isinstance(board, BitBoard) else [row[:] for row in board]
+    board_hash = add_tile_with_hash(future_board, tile, landing, board_hash)
+    return clear_lines_with_hash(future_board, board_hash)
+
+
+# Remove a tile that was added by add_tile_to_board()
+# WARNING: MODIFIES BOARD!!!
+def remove_tile_from_board(board, tile, offsets):
+    if isinstance(board, BitBoard):
+        board.remove_tile(tile, offsets)
+        return
+    for y, row in enumerate(tile):
+        for x, val in enumerate(row):
+            if val != 0:
+                board[y + offsets[1]][min(x + offsets[0], GRID_COL_COUNT - 1)] = 0
+
+
+def get_placement_hash(board, tile, offsets, board_hash=None, heights=None):
+    """
+    Zobrist hash of the board after dropping the tile (before clearing rows), without modifying the board
+
+    :param board: the board to drop the tile on
+    :param tile: the tile shape to drop
+    :param offsets: x, y offsets of the tile before dropping
+    :param board_hash: hash of the board (optional, calculated if not given)
+    :param heights: column heights of the board (optional, speeds up the drop)
+    :return: hash of the resulting board
+    """
+    if board_hash is None:
+        board_hash = get_board_hash(board)
+    offset_x, offset_y = offsets[0], get_effective_height(board, tile, offsets, heights)
+    for cy, mask in enumerate(get_tile_masks(tile)[0]):
+        y = cy + offset_y
+        row = board.rows[y] if isinstance(board, BitBoard) else TZobrist.get_row_mask(board[y])
+        board_hash ^= TZobrist.ROW_KEYS[y][row] ^ TZobrist.ROW_KEYS[y][row | (mask << offset_x)]
+    return board_hash
+
+
+def get_placement_features(board, tile, offsets, heights=None):
+    """
+    Features (see get_board_features) of the board after dropping the tile, without copying the board
+
+    The tile is placed on the board, the features are read and the tile is removed again, so the board is left as it
+    was. Tiles that already collide at <OFFSETS> would overwrite blocks when placed, those are evaluated on a copy.
+
+    :param board: the board to evaluate on
+    :param tile: the tile shape to drop
+    :param offsets: x, y offsets of the tile before dropping
+    :param heights: column heights of the board (optional, speeds up the drop)
+    :return: (aggregate height, hole count, bumpiness, lines cleared, column heights)
+    """
+    landing = (offsets[0], get_effective_height(board, tile, offsets, heights))
+    if landing[1] < offsets[1]:
+        return get_board_features(get_board_with_tile(board, tile, landing))
+    add_tile_to_board(board, tile, landing)
+    features = get_board_features(board)
+    remove_tile_from_board(board, tile, landing)
+    return features
 
 
 ################
@@ -57,6 +183,130 @@ def get_rotated_tile(tile):
     return list(zip(*reversed(tile)))
 
 
+class TileOrientation(NamedTuple):
+    """ One distinct orientation of a tile """
+    # Tile shape (2D tuple)
+    shape: Tuple[Tuple[int, ...], ...]
+    # Number of columns the shape occupies
+    width: int
+    # Row index of the lowest block in each column of the shape
+    bottom: Tuple[int, ...]
+    # Number of rotations from the spawn orientation
+    rotation: int
+    # Bitboard row masks of the shape
+    masks: Tuple[int, ...]
+
+
+def build_tile_orientations(tile_shape):
+    """ List the distinct orientations of a tile shape, in rotation order starting from <TILE_SHAPE> """
+    orientations = []
+    shape = get_shape_key(tile_shape)
+    while all(shape != orientation.shape for orientation in orientations):
+        bottom = tuple(max(y for y in range(len(shape)) if shape[y][x] != 0) for x in range(len(shape[0])))
+        orientations.append(TileOrientation(shape, len(shape[0]), bottom, len(orientations), get_tile_masks(shape)[0]))
+        shape = get_shape_key(get_rotated_tile(shape))
+    return orientations
+
+
+# Distinct orientations of each tile, starting at spawn: {tile: [TileOrientation, ...]}
+TILE_ORIENTATIONS = {tile: build_tile_orientations(shape) for tile, shape in TILE_SHAPES.items()}
+# Distinct orientations starting at any known shape, rotation counted from that shape: {shape: [TileOrientation, ...]}
+SHAPE_ORIENTATIONS = {}
+for _orientations in TILE_ORIENTATIONS.values():
+    for _start in range(len(_orientations)):
+        SHAPE_ORIENTATIONS[_orientations[_start].shape] = [
+            orientation._replace(rotation=rotation)
+            for rotation, orientation in enumerate(_orientations[_start:] + _orientations[:_start])
+        ]
+
+
+def get_tile_orientations(tile_shape):
+    """ Distinct orientations reachable by rotating <TILE_SHAPE>, rotation counts are relative to <TILE_SHAPE> """
+    key = get_shape_key(tile_shape)
+    orientations = SHAPE_ORIENTATIONS.get(key)
+    if orientations is None:
+        orientations = SHAPE_ORIENTATIONS[key] = build_tile_orientations(key)
+    return orientations
+
+
+def get_action_sequence(swap, rotation, from_x, to_x):
+    """
+    Convert a placement into the sequence of actions that performs it
+
+    :param swap: whether to swap the current tile with the next tile first
+    :param rotation: number of rotations
+    :param from_x: current x offset of the tile
+    :param to_x: target x offset of the tile
+    :return: list of actions (integers) that should be executed in order
+    """
+    # Action = index of { NOTHING, L, R, 2L, 2R, ROTATE, SWAP, FAST_FALL, INSTA_FALL }
+    actions = []
+    if swap:
+        actions.append(ACTIONS.index("SWAP"))
+    for _ in range(rotation):
+        actions.append(ACTIONS.index("ROTATE"))
+    temp_x = from_x
+    while temp_x != to_x:
+        direction = 1 if temp_x < to_x else -1
+        magnitude = 1 if abs(temp_x - to_x) == 1 else 2
+        temp_x += direction * magnitude
+        actions.append(ACTIONS.index(("" if magnitude == 1 else "2") + ("R" if direction == 1 else "L")))
+    actions.append(ACTIONS.index("INSTA_FALL"))
+    return actions
+
+
+class GameReplay(NamedTuple):
+    """
+    Everything needed to re-simulate a game played placement by placement
+
+    Resetting a game clears its recording, so with racing extra episodes only the last episode of a game is kept.
+    """
+    # Seed of the game's tile stream
+    seed: int
+    # One byte per placement, see pack_placement()
+    placements: bytes
+    # Final score and board hash, to check the re-simulation
+    score: float
+    board_hash: int
+
+
+class GameSnapshot(NamedTuple):
+    """ Immutable copy of what a display shows of a game, safe to read while the game keeps running """
+    # Board rows (2D tuple)
+    board: Tuple[Tuple[int, ...], ...]
+    # Current tile shape (2D tuple) and location
+    tile_shape: Tuple[Tuple[int, ...], ...]
+    tile_x: int
+    tile_y: int
+    game_over: bool
+    score: float
+    # Version of the game the snapshot was taken at, unchanged versions show the same thing
+    version: int
+
+
+# Packed placement of agents that found no placement, (-1, -1, -1) once unpacked
+INVALID_PLACEMENT = 0xFF
+
+
+def is_valid_placement(tile_choice, rotation, x):
+    """ Whether a placement can be packed (agents return (-1, -1, -1) when they find none) """
+    return tile_choice in (0, 1) and 0 <= rotation < 4 and 0 <= x < 16
+
+
+def pack_placement(tile_choice, rotation, x):
+    """ Pack a placement into 1 byte: tile choice (bit 6), rotation (bits 4-5) and x (bits 0-3), or INVALID_PLACEMENT """
+    if not is_valid_placement(tile_choice, rotation, x):
+        return INVALID_PLACEMENT
+    return tile_choice << 6 | rotation << 4 | x
+
+
+def unpack_placement(value):
+    """ Unpack a placement byte into (tile choice, rotation, x) """
+    if value == INVALID_PLACEMENT:
+        return -1, -1, -1
+    return value >> 6 & 1, value >> 4 & 3, value & 15
+
+
 def get_color_tuple(color_hex):
     if color_hex is None:
         color_hex = "11c5bf"
@@ -69,29 +319,68 @@ def get_color_tuple(color_hex):
 ######################
 # Reference to https://codemyroad.wordpress.com/2013/04/14/tetris-ai-the-near-perfect-player/
 def get_fitness_score(board):
-    board, score_count = get_board_and_lines_cleared(board)
+    aggregate_height, holes, bumpiness, score_count, _ = get_board_features(board)
     score = WEIGHT_LINE_CLEARED * score_count
-    score += WEIGHT_AGGREGATE_HEIGHT * sum(get_col_heights(board))
-    score += WEIGHT_HOLES * get_hole_count(board)
-    score += WEIGHT_BUMPINESS * get_bumpiness(board)
+    score += WEIGHT_AGGREGATE_HEIGHT * aggregate_height
+    score += WEIGHT_HOLES * holes
+    score += WEIGHT_BUMPINESS * bumpiness
     return score
 
 
+# Get every fitness feature of the board (after clearing completed rows) in a single pass
+# Returns: (aggregate height, hole count, bumpiness, lines cleared, column heights)
+# Does NOT modify the board
+def get_board_features(board):
+    if isinstance(board, BitBoard):
+        return board.get_features()
+    # Completed rows are skipped, which is the same as clearing them
+    rows = [row for row in board if 0 in row]
+    row_count = len(rows)
+    heights = [0] * GRID_COL_COUNT
+    uncovered = GRID_COL_COUNT
+    holes = 0
+    for neg_height, row in enumerate(rows):
+        # Every column is covered, all empty spaces from here on are holes
+        if uncovered == 0:
+            holes += row.count(0)
+            continue
+        # Nothing is covered yet, skip empty rows
+        if uncovered == GRID_COL_COUNT and not any(row):
+            continue
+        for i, val in enumerate(row):
+            if val == 0:
+                if heights[i]:
+                    holes += 1
+            elif not heights[i]:
+                heights[i] = row_count - neg_height
+                uncovered -= 1
+    bumpiness = 0
+    for i in range(1, GRID_COL_COUNT):
+        bumpiness += abs(heights[i - 1] - heights[i])
+    return sum(heights), holes, bumpiness, len(board) - row_count, heights
+
+
 # Get height of each column
 def get_col_heights(board):
+    if isinstance(board, BitBoard):
+        return board.get_col_heights()
     heights = [0] * GRID_COL_COUNT
-    cols = list(range(GRID_COL_COUNT))
+    uncovered = GRID_COL_COUNT
     for neg_height, row in enumerate(board):
         for i, val in enumerate(row):
-            if val == 0 or i not in cols:
+            if val == 0 or heights[i]:
                 continue
             heights[i] = GRID_ROW_COUNT - neg_height
-            cols.remove(i)
+            uncovered -= 1
+        if uncovered == 0:
+            break
     return heights
 
 
 # Count of empty spaces below covers
 def get_hole_count(board):
+    if isinstance(board, BitBoard):
+        return board.get_hole_count()
     holes = 0
     cols = [0] * GRID_COL_COUNT
     for neg_height, row in enumerate(board):
@@ -107,6 +396,8 @@ def get_hole_count(board):
 
 # Get the unevenness of the board
 def get_bumpiness(board):
+    if isinstance(board, BitBoard):
+        return board.get_bumpiness()
     bumpiness = 0
     heights = get_col_heights(board)
     for i in range(1, GRID_COL_COUNT):
@@ -114,9 +405,32 @@ def get_bumpiness(board):
     return bumpiness
 
 
+# Zobrist hash of the board
+def get_board_hash(board):
+    if isinstance(board, BitBoard):
+        return board.hash
+    return TZobrist.get_board_hash([TZobrist.get_row_mask(row) for row in board])
+
+
+# Clear completed rows and update the board's Zobrist hash
+# WARNING: MODIFIES BOARD!!!
+def clear_lines_with_hash(board, board_hash):
+    if isinstance(board, BitBoard):
+        cleared = board.clear_lines()
+        return board, cleared, board.hash
+    # Nothing to clear (most of the time)
+    if all(0 in row for row in board):
+        return board, 0, board_hash
+    board_hash = TZobrist.get_cleared_hash(board_hash, [TZobrist.get_row_mask(row) for row in board])
+    board, cleared = get_board_and_lines_cleared(board)
+    return board, cleared, board_hash
+
+
 # Get potential lines cleared
 # WARNING: MODIFIES BOARD!!!
 def get_board_and_lines_cleared(board):
+    if isinstance(board, BitBoard):
+        return board, board.clear_lines()
     score_count = 0
     row = 0
     while True:
@@ -0,0 +1,262 @@
+""" This file provides a vectorized Tetris environment that steps many games at once as NumPy arrays """
+
+# Imports
+import numpy as np
+import TetrisUtils as TUtils
+from TetrisSettings import *
+
+
+###########################
+# Precomputed Tile Tables #
+###########################
+def build_tile_tables():
+    """
+    Build the per-(tile, rotation) lookup tables used by VecTetris
+
+    Tiles are indexed like TILES, rotations are padded to 4 by wrapping around the distinct orientations.
+
+    :return: (cell y offsets, cell x offsets, widths, heights, orientation counts, spawn x offsets)
+    """
+    cell_y = np.zeros((len(TILES), 4, 4), dtype=np.int64)
+    cell_x = np.zeros((len(TILES), 4, 4), dtype=np.int64)
+    widths = np.zeros((len(TILES), 4), dtype=np.int64)
+    heights = np.zeros((len(TILES), 4), dtype=np.int64)
+    counts = np.zeros(len(TILES), dtype=np.int64)
+    spawn_x = np.zeros(len(TILES), dtype=np.int64)
+    for t, tile in enumerate(TILES):
+        orientations = TUtils.TILE_ORIENTATIONS[tile]
+        counts[t] = len(orientations)
+        spawn_x[t] = int(GRID_COL_COUNT / 2 - orientations[0].width / 2)
+        for rotation in range(4):
+            shape = orientations[rotation % len(orientations)].shape
+            cells = [(y, x) for y, row in enumerate(shape) for x, val in enumerate(row) if val != 0]
+            cell_y[t, rotation] = [y for y, _ in cells]
+            cell_x[t, rotation] = [x for _, x in cells]
+            widths[t, rotation] = len(shape[0])
+            heights[t, rotation] = len(shape)
+    return cell_y, cell_x, widths, heights, counts, spawn_x
+
+
+CELL_Y, CELL_X, TILE_WIDTHS, TILE_HEIGHTS, ORIENTATION_COUNTS, SPAWN_X = build_tile_tables()
+
+
+class VecTetris:
+    """
+    N Tetris games stored in contiguous NumPy arrays and stepped together
+
+    Follows the same rules as Tetris.step(), including scoring. Tiles are indexed like TILES and rotations index
+    TUtils.TILE_ORIENTATIONS. Finished games are reset automatically (if <AUTO_RESET>) and their final score is kept
+    in <final_scores>.
+    """
+
+    def __init__(self, game_count: int, seed=None, auto_reset: bool = True):
+        self.game_count = game_count
+        self.auto_reset = auto_reset
+        self.rng = np.random.default_rng(seed)
+
+        ##################
+        # Game logistics #
+        ##################
+        # Game boards: (games, rows, cols) array of tile values
+        self.boards = np.zeros((game_count, GRID_ROW_COUNT, GRID_COL_COUNT), dtype=np.int8)
+        # Tile pools: one shuffled bag of tiles per game, read from <pool_index>
+        self.tile_pools = np.zeros((game_count, len(TILES)), dtype=np.int64)
+        self.pool_index = np.zeros(game_count, dtype=np.int64)
+        # Current tile, rotation and location
+        self.tiles = np.zeros(game_count, dtype=np.int64)
+        self.rotations = np.zeros(game_count, dtype=np.int64)
+        self.tile_x = np.zeros(game_count, dtype=np.int64)
+        self.tile_y = np.zeros(game_count, dtype=np.int64)
+        self.game_over = np.zeros(game_count, dtype=bool)
+
+        ##############
+        # Statistics #
+        ##############
+        self.scores = np.zeros(game_count, dtype=np.float64)
+        # Score of the last finished game in each slot, and number of finished games
+        self.final_scores = np.zeros(game_count, dtype=np.float64)
+        self.episode_counts = np.zeros(game_count, dtype=np.int64)
+
+        self.reset_games(np.ones(game_count, dtype=bool))
+
+    def reset_games(self, mask):
+        """ Resets the games selected by the boolean <MASK> """
+        idx = np.nonzero(mask)[0]
+        self.boards[idx] = 0
+        self.scores[idx] = 0.0
+        self.game_over[idx] = False
+        self.pool_index[idx] = len(TILES)
+        self.spawn_tiles(idx)
+
+    def step(self, actions):
+        """
+        Advance every live game by one step
+
+        :param actions: array of actions, one per game, see Tetris.step()
+        :return: (score changes, games that ended this step)
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        assert ((actions >= 0) & (actions <= 8)).all(), "Invalid action, use 0-8 for actions"
+        previous_scores = self.scores.copy()
+        # Finished games ignore steps until they are reset
+        live = ~self.game_over
+
+        # Move tile
+        for action, delta in ((1, -1), (2, 1), (3, -2), (4, 2)):
+            self.move_tiles(np.nonzero(live & (actions == action))[0], delta)
+        # Rotate tile
+        self.rotate_tiles(np.nonzero(live & (actions == 5))[0])
+        # Swap current & future tile
+        self.swap_tiles(np.nonzero(live & (actions == 6))[0])
+        # Fast fall / instant fall
+        self.drop_tiles(np.nonzero(live & (actions == 7))[0])
+        self.drop_tiles(np.nonzero(live & (actions == 8))[0], instant=True)
+
+        # Drop tile by 1 grid (same as Tetris.step(), this also applies to games that just ended)
+        self.drop_tiles(np.nonzero(live)[0])
+
+        rewards = self.scores - previous_scores
+        done = live & self.game_over
+        if done.any():
+            self.final_scores[done] = self.scores[done]
+            self.episode_counts[done] += 1
+            if self.auto_reset:
+                self.reset_games(done)
+        return rewards, done
+
+    #########################
+    # Step Action Functions #
+    #########################
+    def move_tiles(self, idx, delta: int):
+        """ Move the tiles of games <IDX> by <DELTA> grids, see Tetris.move_tile() """
+        if len(idx) == 0:
+            return
+        widths = TILE_WIDTHS[self.tiles[idx], self.rotations[idx]]
+        new_x = np.clip(self.tile_x[idx] + delta, 0, GRID_COL_COUNT - widths)
+        ok = ~self.check_collision(idx, self.tiles[idx], self.rotations[idx], new_x, self.tile_y[idx])
+        self.tile_x[idx[ok]] = new_x[ok]
+
+    def rotate_tiles(self, idx):
+        """ Rotate the tiles of games <IDX> by 90 degrees, see Tetris.rotate_tile() """
+        if len(idx) == 0:
+            return
+        tiles = self.tiles[idx]
+        new_rotations = (self.rotations[idx] + 1) % ORIENTATION_COUNTS[tiles]
+        new_x = np.minimum(self.tile_x[idx], GRID_COL_COUNT - TILE_WIDTHS[tiles, new_rotations])
+        ok = ~self.check_collision(idx, tiles, new_rotations, new_x, self.tile_y[idx])
+        self.tile_x[idx[ok]] = new_x[ok]
+        self.rotations[idx[ok]] = new_rotations[ok]
+
+    def swap_tiles(self, idx):
+        """ Swap the tiles of games <IDX> with their next tiles, see Tetris.swap_tile() """
+        if len(idx) == 0:
+            return
+        new_tiles = self.tile_pools[idx, self.pool_index[idx]]
+        new_rotations = np.zeros(len(idx), dtype=np.int64)
+        # Out of range detection (uses the current tile's size, same as Tetris)
+        tiles, rotations = self.tiles[idx], self.rotations[idx]
+        temp_x = np.minimum(self.tile_x[idx], GRID_COL_COUNT - TILE_WIDTHS[tiles, rotations])
+        temp_y = np.minimum(self.tile_y[idx], GRID_ROW_COUNT - TILE_HEIGHTS[tiles, rotations])
+        ok = ~self.check_collision(idx, new_tiles, new_rotations, temp_x, temp_y)
+        swapped = idx[ok]
+        # Put current tile as the next tile
+        self.tile_pools[swapped, self.pool_index[swapped]] = self.tiles[swapped]
+        self.tiles[swapped] = new_tiles[ok]
+        self.rotations[swapped] = 0
+        self.tile_x[swapped] = temp_x[ok]
+        self.tile_y[swapped] = temp_y[ok]
+
+    def drop_tiles(self, idx, instant=False):
+        """ Drop the tiles of games <IDX> by 1 grid (or all the way if <INSTANT>), see Tetris.drop_tile() """
+        if len(idx) == 0:
+            return
+        if instant:
+            new_y = self.get_effective_heights(idx)
+            self.tile_y[idx] = new_y + 1
+            # Same score change as Tetris.drop_tile()
+            self.scores[idx] += PER_STEP_SCORE_GAIN * (new_y - self.tile_y[idx])
+            self.lock_tiles(idx)
+            return
+        self.tile_y[idx] += 1
+        self.scores[idx] += PER_STEP_SCORE_GAIN
+        collided = self.check_collision(idx, self.tiles[idx], self.rotations[idx], self.tile_x[idx], self.tile_y[idx])
+        self.lock_tiles(idx[collided])
+
+    def lock_tiles(self, idx):
+        """ Add the tiles of games <IDX> to their boards, clear rows, score and spawn the next tiles """
+        if len(idx) == 0:
+            return
+        tiles, rotations = self.tiles[idx], self.rotations[idx]
+        cell_y = self.tile_y[idx, None] - 1 + CELL_Y[tiles, rotations]
+        cell_x = np.minimum(self.tile_x[idx, None] + CELL_X[tiles, rotations], GRID_COL_COUNT - 1)
+        self.boards[idx[:, None], cell_y, cell_x] = (tiles + 1)[:, None]
+
+        # Check completed rows, move them to the top and empty them
+        full = (self.boards[idx] != 0).all(axis=2)
+        row_completed = full.sum(axis=1)
+        cleared = row_completed > 0
+        if cleared.any():
+            cleared_idx = idx[cleared]
+            order = np.argsort(~full[cleared], axis=1, kind="stable")
+            boards = np.take_along_axis(self.boards[cleared_idx], order[:, :, None], axis=1)
+            boards[np.arange(GRID_ROW_COUNT)[None, :] < row_completed[cleared][:, None]] = 0
+            self.boards[cleared_idx] = boards
+
+        # Calculate total score
+        self.scores[idx] += MULTI_SCORE_ALGORITHM(row_completed.astype(np.float64))
+
+        # Spawn next tile
+        self.spawn_tiles(idx)
+
+    #####################
+    # Utility Functions #
+    #####################
+    def spawn_tiles(self, idx):
+        """ Spawn new tiles for games <IDX> from their tile pools, and update their game over status """
+        self.refill_tile_pools(idx)
+        self.tiles[idx] = self.tile_pools[idx, self.pool_index[idx]]
+        self.pool_index[idx] += 1
+        self.refill_tile_pools(idx)
+        self.rotations[idx] = 0
+        self.tile_x[idx] = SPAWN_X[self.tiles[idx]]
+        self.tile_y[idx] = 0
+        # Game over check: game over if new tile collides with existing blocks
+        self.game_over[idx] = self.check_collision(idx, self.tiles[idx], self.rotations[idx], self.tile_x[idx], self.tile_y[idx])
+
+    def refill_tile_pools(self, idx):
+        """ Generate new shuffled tile pools for the games in <IDX> whose pool is used up """
+        empty = idx[self.pool_index[idx] >= len(TILES)]
+        if len(empty) == 0:
+            return
+        self.tile_pools[empty] = self.rng.permuted(np.tile(np.arange(len(TILES)), (len(empty), 1)), axis=1)
+        self.pool_index[empty] = 0
+
+    def check_collision(self, idx, tiles, rotations, tile_x, tile_y):
+        """ Whether each tile collides with existing blocks or the boundaries of its board (games <IDX>) """
+        cell_y = tile_y[:, None] + CELL_Y[tiles, rotations]
+        cell_x = tile_x[:, None] + CELL_X[tiles, rotations]
+        outside = (cell_x < 0) | (cell_x >= GRID_COL_COUNT) | (cell_y >= GRID_ROW_COUNT)
+        blocked = self.boards[idx[:, None], np.minimum(cell_y, GRID_ROW_COUNT - 1), np.clip(cell_x, 0, GRID_COL_COUNT - 1)] != 0
+        return (outside | blocked).any(axis=1)
+
+    def get_effective_heights(self, idx):
+        """ Lowest non-colliding y offset of the tiles of games <IDX>, see TUtils.get_effective_height() """
+        tiles, rotations, tile_x = self.tiles[idx], self.rotations[idx], self.tile_x[idx]
+        offset_y = self.tile_y[idx].copy()
+        falling = ~self.check_collision(idx, tiles, rotations, tile_x, offset_y)
+        while falling.any():
+            offset_y[falling] += 1
+            falling[falling] = ~self.check_collision(idx[falling], tiles[falling], rotations[falling], tile_x[falling], offset_y[falling])
+        return offset_y - 1
+
+    def get_next_tiles(self):
+        """ Next tile of every game """
+        return self.tile_pools[np.arange(self.game_count), self.pool_index]
+
+    def get_board(self, index: int):
+        """ Board of one game as a 2D list, so it can be used with TUtils and agents """
+        return self.boards[index].tolist()
+
+    def get_tile_shape(self, index: int):
+        """ Current tile shape of one game """
+        return TUtils.TILE_ORIENTATIONS[TILES[self.tiles[index]]][self.rotations[index]].shape
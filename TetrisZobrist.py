@@ -0,0 +1,70 @@
+""" This file provides Zobrist hashing of Tetris boards, so any board state has a cheap 64-bit identity """
+
+# Imports
+import random
+from TetrisSettings import *
+
+# Fixed seed so hashes are the same across processes and runs
+ZOBRIST_SEED = 20201008
+
+
+def build_cell_keys(seed=ZOBRIST_SEED):
+    """ Random 64-bit key of each board cell """
+    rng = random.Random(seed)
+    return [[rng.getrandbits(64) for _ in range(GRID_COL_COUNT)] for _ in range(GRID_ROW_COUNT)]
+
+
+def build_row_keys(cell_keys):
+    """
+    Combined key of every possible row bitmask (column x = bit x) on every row
+
+    :param cell_keys: key of each board cell
+    :return: ROW_KEYS[y][mask], the XOR of the cell keys of the filled columns in <MASK>
+    """
+    row_keys = []
+    for keys in cell_keys:
+        row = [0] * (1 << GRID_COL_COUNT)
+        for mask in range(1, 1 << GRID_COL_COUNT):
+            low = mask & -mask
+            row[mask] = row[mask ^ low] ^ keys[low.bit_length() - 1]
+        row_keys.append(row)
+    return row_keys
+
+
+CELL_KEYS = build_cell_keys()
+ROW_KEYS = build_row_keys(CELL_KEYS)
+
+
+def get_row_mask(row):
+    """ Bitmask of the filled cells of a 2D list board row """
+    return sum(1 << x for x, val in enumerate(row) if val != 0)
+
+
+def get_board_hash(row_masks):
+    """ Zobrist hash of a board from its row bitmasks (top to bottom) """
+    board_hash = 0
+    for y, mask in enumerate(row_masks):
+        board_hash ^= ROW_KEYS[y][mask]
+    return board_hash
+
+
+def get_cleared_hash(board_hash, row_masks):
+    """
+    Update a board hash for clearing the completed rows
+
+    Only the completed rows and the rows moving down are re-hashed.
+
+    :param board_hash: hash of the board before clearing
+    :param row_masks: row bitmasks of the board before clearing (top to bottom)
+    :return: hash of the board after clearing
+    """
+    full_mask = (1 << GRID_COL_COUNT) - 1
+    shift = 0
+    for y in range(len(row_masks) - 1, -1, -1):
+        mask = row_masks[y]
+        if mask == full_mask:
+            board_hash ^= ROW_KEYS[y][mask]
+            shift += 1
+        elif shift and mask:
+            board_hash ^= ROW_KEYS[y][mask] ^ ROW_KEYS[y + shift][mask]
+    return board_hash
@@ -0,0 +1,55 @@
+import random
+import pytest
+from Tetris import Tetris
+import TetrisUtils as TUtils
+import TetrisBatch as TBatch
+from TetrisCache import FeatureCache
+from TetrisAgents import GeneticAgentComplete, BatchGeneticAgent
+from TetrisSettings import *
+
+SEED = 7
+PLACEMENT_COUNT = 300
+OPTIMAL_WEIGHTS = (WEIGHT_AGGREGATE_HEIGHT, WEIGHT_HOLES, WEIGHT_BUMPINESS, WEIGHT_LINE_CLEARED)
+
+
+def get_agent(agent_class, weights):
+    agent = agent_class()
+    agent.weight_height, agent.weight_holes, agent.weight_bumpiness, agent.weight_line_clear = weights
+    return agent
+
+
+def test_best_placement_matches_sequential():
+    rng = random.Random(SEED)
+    # Optimal weights (to get a long game) and random weights
+    all_weights = [OPTIMAL_WEIGHTS] + [tuple(rng.uniform(-1, 1) for _ in range(4)) for _ in range(3)]
+    agents = [get_agent(GeneticAgentComplete, weights) for weights in all_weights]
+    cache = FeatureCache()
+    tetris = Tetris(seed=SEED)
+    for _ in range(PLACEMENT_COUNT):
+        tiles = [tetris.tile_shape, TILE_SHAPES[tetris.get_next_tile()]]
+        offsets = (tetris.tile_x, tetris.tile_y)
+        for agent, weights in zip(agents, all_weights):
+            placement = agent.calculate_placement(tetris.board, tiles[0], tiles[1], offsets)
+            fitness, *batch_placement = TBatch.get_best_placement(tetris.board, tiles, offsets, weights)
+            assert tuple(batch_placement) == placement
+            tile_index, rotation, x = placement
+            shape = TUtils.get_tile_orientations(tiles[tile_index])[rotation].shape
+            assert fitness == pytest.approx(agent.evaluate_placement(tetris.board, shape, (x, offsets[1])))
+            # Cached batches give the same result
+            assert TBatch.get_best_placement(tetris.board, tiles, offsets, weights, None, cache,
+                                             tetris.board_hash) == (fitness, *placement)
+        tetris.play_placement(*agents[0].calculate_placement(tetris.board, tiles[0], tiles[1], offsets))
+        assert not tetris.game_over
+    assert cache.hits > 0
+
+
+def test_batch_agent_plays_the_same_game():
+    games = [Tetris(seed=SEED) for _ in range(2)]
+    agents = [get_agent(GeneticAgentComplete, OPTIMAL_WEIGHTS), get_agent(BatchGeneticAgent, OPTIMAL_WEIGHTS)]
+    for _ in range(PLACEMENT_COUNT):
+        placements = [agent.get_placement(tetris) for tetris, agent in zip(games, agents)]
+        assert placements[0] == placements[1]
+        for tetris, placement in zip(games, placements):
+            tetris.play_placement(*placement)
+    assert games[0].score == games[1].score
+    assert games[0].board_hash == games[1].board_hash
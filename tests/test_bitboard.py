@@ -0,0 +1,66 @@
+from Tetris import Tetris
+import TetrisUtils as TUtils
+from TetrisBitboard import BitBoard
+from TetrisAgents import GeneticAgentComplete
+from TetrisSettings import *
+
+SEED = 4
+PLACEMENT_COUNT = 300
+
+
+def get_agent():
+    """ Agent with the "optimal" weights, it survives every placement of the tests """
+    agent = GeneticAgentComplete()
+    agent.weight_height, agent.weight_holes = WEIGHT_AGGREGATE_HEIGHT, WEIGHT_HOLES
+    agent.weight_bumpiness, agent.weight_line_clear = WEIGHT_BUMPINESS, WEIGHT_LINE_CLEARED
+    return agent
+
+
+def get_cells(board):
+    return [list(row) for row in board]
+
+
+def test_games_match():
+    agent = get_agent()
+    list_game = Tetris(bitboard=False, seed=SEED)
+    bit_game = Tetris(bitboard=True, seed=SEED)
+    assert isinstance(bit_game.board, BitBoard)
+    cleared = False
+    for _ in range(PLACEMENT_COUNT):
+        placement = agent.get_placement(list_game)
+        assert agent.get_placement(bit_game) == placement
+        blocks_before = sum(val != 0 for row in list_game.board for val in row)
+        list_game.play_placement(*placement)
+        bit_game.play_placement(*placement)
+        cleared |= sum(val != 0 for row in list_game.board for val in row) < blocks_before
+        assert get_cells(bit_game.board) == get_cells(list_game.board)
+        assert bit_game.score == list_game.score
+        assert bit_game.board_hash == list_game.board_hash
+        assert bit_game.col_heights == list_game.col_heights
+        assert not list_game.game_over and not bit_game.game_over
+    # The games went through line clears
+    assert cleared
+
+
+def test_board_functions_match():
+    tetris = Tetris(bitboard=False, seed=SEED)
+    agent = get_agent()
+    for placement_index in range(PLACEMENT_COUNT):
+        board = tetris.board
+        bit_board = BitBoard.from_list(board)
+        assert TUtils.get_board_features(bit_board) == TUtils.get_board_features(board)
+        assert TUtils.get_col_heights(bit_board) == TUtils.get_col_heights(board)
+        assert TUtils.get_board_hash(bit_board) == TUtils.get_board_hash(board)
+        # Collisions and drops of every orientation of the current tile, up to past the right and bottom edges (list
+        # boards wrap negative x around, the game never checks those)
+        if placement_index % 10 == 0:
+            for orientation in TUtils.get_tile_orientations(tetris.tile_shape):
+                for x in range(0, GRID_COL_COUNT + 1):
+                    for y in range(0, GRID_ROW_COUNT + 1, 3):
+                        assert TUtils.check_collision(bit_board, orientation.shape, (x, y)) == \
+                               TUtils.check_collision(board, orientation.shape, (x, y))
+                for x in range(0, GRID_COL_COUNT - orientation.width + 1):
+                    offsets = (x, tetris.tile_y)
+                    assert TUtils.get_placement_features(bit_board, orientation.shape, offsets) == \
+                           TUtils.get_placement_features(board, orientation.shape, offsets)
+        tetris.play_placement(*agent.get_placement(tetris))
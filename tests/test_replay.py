@@ -0,0 +1,59 @@
+import random
+from Tetris import Tetris
+import TetrisUtils as TUtils
+import TetrisReplay as TReplay
+from TetrisAgents import GeneticAgentComplete
+from TetrisSettings import *
+
+SEED = 1234
+PLACEMENT_COUNT = 300
+
+
+def play_recorded_game(seed=SEED, placements=PLACEMENT_COUNT):
+    """ Game of an agent with the "optimal" weights, recorded placement by placement """
+    random.seed(seed)
+    agent = GeneticAgentComplete()
+    agent.weight_height, agent.weight_holes = WEIGHT_AGGREGATE_HEIGHT, WEIGHT_HOLES
+    agent.weight_bumpiness, agent.weight_line_clear = WEIGHT_BUMPINESS, WEIGHT_LINE_CLEARED
+    tetris = Tetris(seed=seed, record=True)
+    for _ in range(placements):
+        if tetris.game_over:
+            break
+        tetris.play_placement(*agent.get_placement(tetris))
+    return tetris
+
+
+def test_replay_round_trip(tmp_path):
+    tetris = play_recorded_game()
+    replay = tetris.get_replay()
+    assert len(replay.placements) == PLACEMENT_COUNT
+    path = str(tmp_path / "replays.bin")
+    TReplay.write_replays(path, [replay], append=False)
+    (loaded,) = TReplay.read_replays(path)
+    assert loaded == replay
+    for bitboard in (False, True):
+        replayed = TReplay.replay_game(loaded, bitboard)
+        assert replayed.score == tetris.score
+        assert replayed.board_hash == tetris.board_hash
+        assert [list(row) for row in replayed.board] == [list(row) for row in tetris.board]
+
+
+def test_replay_detects_changes():
+    replay = play_recorded_game().get_replay()
+    assert TReplay.verify_replay(replay)
+    assert not TReplay.verify_replay(replay._replace(score=replay.score + 1))
+    assert not TReplay.verify_replay(replay._replace(placements=replay.placements[:-1]))
+
+
+def test_invalid_placement():
+    assert TUtils.pack_placement(-1, -1, -1) == TUtils.INVALID_PLACEMENT
+    assert TUtils.unpack_placement(TUtils.INVALID_PLACEMENT) == (-1, -1, -1)
+    for placement in ((0, 0, 0), (1, 3, 9), (0, 2, 15)):
+        assert TUtils.unpack_placement(TUtils.pack_placement(*placement)) == placement
+    tetris = Tetris(seed=SEED, record=True)
+    tetris.play_placement(-1, -1, -1)
+    tetris.play_placement(0, 1, 3)
+    tetris.play_placement(-1, -1, -1)
+    replay = tetris.get_replay()
+    assert replay.placements.count(TUtils.INVALID_PLACEMENT) == 2
+    assert TReplay.verify_replay(replay)
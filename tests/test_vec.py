@@ -0,0 +1,69 @@
+import random
+from Tetris import Tetris
+from TetrisVec import VecTetris
+from TetrisAgents import GeneticAgentComplete
+from TetrisSettings import *
+
+SEED = 13
+GAME_COUNT = 8
+STEP_COUNT = 600
+# Share of the actions chosen randomly instead of by the agent
+RANDOM_ACTION_RATE = 0.2
+
+
+def feed_tiles(tetris, vec, index, current=False):
+    """ Give the Tetris game the rest of the current bag of VecTetris game #<INDEX> (with its current tile) """
+    stream = tetris.tile_stream
+    stream.tiles = [TILES[tile] for tile in vec.tile_pools[index, vec.pool_index[index]:]]
+    if current:
+        stream.tiles.insert(0, TILES[vec.tiles[index]])
+    stream.cursor = 0
+
+
+def assert_same_game(tetris, vec, index):
+    assert tetris.game_over == vec.game_over[index]
+    assert tetris.board == vec.get_board(index)
+    assert tetris.score == vec.scores[index]
+    if not tetris.game_over:
+        assert tetris.current_tile == TILES[vec.tiles[index]]
+        assert tetris.get_next_tile() == TILES[vec.get_next_tiles()[index]]
+        assert (tetris.tile_rotation, tetris.tile_x, tetris.tile_y) == \
+               (vec.rotations[index], vec.tile_x[index], vec.tile_y[index])
+
+
+def test_lockstep_with_tetris():
+    rng = random.Random(SEED)
+    vec = VecTetris(GAME_COUNT, seed=SEED, auto_reset=False)
+    games = []
+    for a in range(GAME_COUNT):
+        tetris = Tetris(bitboard=False, seed=SEED)
+        feed_tiles(tetris, vec, a, current=True)
+        tetris.reset_game()
+        games.append(tetris)
+        assert_same_game(tetris, vec, a)
+    agents = [GeneticAgentComplete() for _ in range(GAME_COUNT)]
+    for agent in agents:
+        agent.weight_height, agent.weight_holes = WEIGHT_AGGREGATE_HEIGHT, WEIGHT_HOLES
+        agent.weight_bumpiness, agent.weight_line_clear = WEIGHT_BUMPINESS, WEIGHT_LINE_CLEARED
+    cleared = False
+    for _ in range(STEP_COUNT):
+        # Actions of an agent clearing rows, and random actions (swaps, drops...) wrecking its plan now and then
+        actions = []
+        for tetris, agent in zip(games, agents):
+            if tetris.game_over:
+                actions.append(0)
+            elif rng.random() < RANDOM_ACTION_RATE:
+                actions.append(rng.randint(0, 8))
+            else:
+                actions.append(agent.get_action(tetris))
+        vec.step(actions)
+        for a, tetris in enumerate(games):
+            score = tetris.score
+            tetris.step(actions[a])
+            cleared |= tetris.score - score >= MULTI_SCORE_ALGORITHM(1)
+            # A new bag may have been drawn by VecTetris, both games draw the same tiles
+            if not tetris.game_over:
+                feed_tiles(tetris, vec, a)
+            assert_same_game(tetris, vec, a)
+    assert cleared
+    assert any(tetris.game_over for tetris in games)
@@ -0,0 +1,57 @@
+import pytest
+from Tetris import Tetris
+import TetrisUtils as TUtils
+import TetrisZobrist as TZobrist
+from TetrisAgents import GeneticAgentComplete
+from TetrisSettings import *
+
+SEED = 11
+PLACEMENT_COUNT = 300
+
+
+def get_full_hash(board):
+    """ Zobrist hash from scratch: XOR of the keys of every filled cell """
+    board_hash = 0
+    for y, row in enumerate(board):
+        for x, val in enumerate(row):
+            if val != 0:
+                board_hash ^= TZobrist.CELL_KEYS[y][x]
+    return board_hash
+
+
+def get_agent():
+    agent = GeneticAgentComplete()
+    agent.weight_height, agent.weight_holes = WEIGHT_AGGREGATE_HEIGHT, WEIGHT_HOLES
+    agent.weight_bumpiness, agent.weight_line_clear = WEIGHT_BUMPINESS, WEIGHT_LINE_CLEARED
+    return agent
+
+
+@pytest.mark.parametrize("bitboard", [False, True])
+def test_incremental_hash_matches_full_hash(bitboard):
+    agent = get_agent()
+    tetris = Tetris(bitboard=bitboard, seed=SEED)
+    cleared = False
+    for placement_index in range(PLACEMENT_COUNT):
+        board = tetris.board
+        assert tetris.board_hash == get_full_hash(board)
+        assert TUtils.get_board_hash(board) == tetris.board_hash
+        # Hashes of the candidate boards, before and after clearing completed rows
+        if placement_index % 10 == 0:
+            heights = TUtils.get_col_heights(board)
+            for orientation in TUtils.get_tile_orientations(tetris.tile_shape):
+                for x in range(0, GRID_COL_COUNT - orientation.width + 1):
+                    offsets = (x, tetris.tile_y)
+                    dropped = TUtils.get_future_board_with_tile(board, orientation.shape, offsets)
+                    assert TUtils.get_placement_hash(board, orientation.shape, offsets, tetris.board_hash,
+                                                     heights) == get_full_hash(dropped)
+                    future_board, _, future_hash = TUtils.get_future_board_and_hash(
+                        board, orientation.shape, offsets, tetris.board_hash, heights)
+                    assert future_hash == get_full_hash(future_board)
+            # The board itself is left untouched
+            assert get_full_hash(board) == tetris.board_hash
+        score = tetris.score
+        tetris.play_placement(*agent.get_placement(tetris))
+        # Line clears score at least MULTI_SCORE_ALGORITHM(1)
+        cleared |= tetris.score - score >= MULTI_SCORE_ALGORITHM(1)
+        assert not tetris.game_over
+    assert cleared